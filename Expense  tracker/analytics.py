@@ -0,0 +1,294 @@
+"""Vectorised expense analytics.
+
+Expenses are loaded once into NumPy columns (user, day, category, amount) and
+every report is computed with array operations instead of Python loops over
+the expense dicts. Used by the /expenses/reports routes and as an offline
+batch job:
+
+    python analytics.py expenses.json --out reports.json
+    python analytics.py expenses.json --user <user_id>
+"""
+import argparse
+import itertools
+import json
+import sys
+from datetime import date
+
+import numpy as np
+
+import archive
+import records
+
+ROLLING_WINDOWS = (30, 90)
+TREND_MONTHS = 6
+OUTLIER_Z = 3.0
+
+_EPOCH = date(1970, 1, 1).toordinal()
+
+
+class ExpenseColumns:
+    """Columnar view of the expense store, sorted by (user, day)"""
+
+    def __init__(self, expenses):
+        users = {}
+        categories = {}
+        user_codes = []
+        category_codes = []
+        days = []
+        amounts = []
+        income = []
+
+        for expense in expenses:
+            day = records.pack_day(expense.get('date'))
+            day = day if type(day) is int else day[0]
+            if day is None:
+                continue
+            try:
+                amount = float(expense.get('amount', 0))
+            except (TypeError, ValueError):
+                continue
+            user_codes.append(users.setdefault(expense.get('user_id'), len(users)))
+            category_codes.append(categories.setdefault(expense.get('category', 'Uncategorized'), len(categories)))
+            days.append(day)
+            amounts.append(amount)
+            income.append(expense.get('type') == 'income' or amount < 0)
+
+        self.user_ids = list(users)
+        self.categories = list(categories)
+        self.user_index = users
+
+        user = np.asarray(user_codes, dtype=np.int32)
+        day = np.asarray(days, dtype=np.int32)
+        order = np.lexsort((day, user))
+        self.user = user[order]
+        self.day = day[order]
+        self.category = np.asarray(category_codes, dtype=np.int32)[order]
+        self.amount = np.asarray(amounts, dtype=np.float64)[order]
+        self.income = np.asarray(income, dtype=bool)[order]
+
+        # Row range per user, since rows are sorted by user
+        self.bounds = np.searchsorted(self.user, np.arange(len(self.user_ids) + 1))
+
+    @classmethod
+    def from_file(cls, path, archive_dir=archive.ARCHIVE_DIR):
+        """Hot store at `path` plus everything archived under `archive_dir`"""
+        with open(path, 'r') as f:
+            hot = json.load(f)
+        return cls(itertools.chain(archive.iter_archived('expenses', archive_dir=archive_dir), hot))
+
+    def __len__(self):
+        return len(self.amount)
+
+    def rows(self, user_id):
+        code = self.user_index.get(user_id)
+        if code is None:
+            return slice(0, 0)
+        return slice(self.bounds[code], self.bounds[code + 1])
+
+    def month(self, day=None):
+        """Months since 1970-01 for each row (or for the given day ordinals)"""
+        day = self.day if day is None else day
+        return (np.asarray(day, dtype=np.int64) - _EPOCH).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+
+def _today():
+    return date.today().toordinal()
+
+
+def _month_label(month):
+    return str(np.datetime64(int(month), 'M'))
+
+
+def _spend(columns, rows):
+    """Day, category and amount of the non-income rows in `rows`"""
+    keep = ~columns.income[rows]
+    return columns.day[rows][keep], columns.category[rows][keep], columns.amount[rows][keep]
+
+
+def rolling_averages(columns, user_id, end=None, windows=ROLLING_WINDOWS):
+    """Average daily spend over each trailing window, plus the daily series for the longest window"""
+    end = _today() if end is None else end
+    span = max(windows)
+    days, _, amounts = _spend(columns, columns.rows(user_id))
+
+    # Daily totals over the last `span * 2` days so every point of the series has a full window
+    start = end - 2 * span + 1
+    keep = (days >= start) & (days <= end)
+    daily = np.bincount(days[keep] - start, weights=amounts[keep], minlength=2 * span)
+    cumulative = np.concatenate(([0.0], np.cumsum(daily)))
+
+    result = {'end': date.fromordinal(end).isoformat(), 'windows': {}}
+    for window in windows:
+        sums = cumulative[window:] - cumulative[:-window]
+        series = sums[-span:] / window
+        result['windows'][str(window)] = {
+            'current': round(float(series[-1]), 2),
+            'series': [round(float(value), 2) for value in series],
+        }
+    return result
+
+
+def year_over_year(columns, user_id, end=None):
+    """Monthly spend for the 12 months up to `end` against the same months a year earlier"""
+    end = _today() if end is None else end
+    days, _, amounts = _spend(columns, columns.rows(user_id))
+    last = int(columns.month([end])[0])
+    first = last - 23
+
+    months = columns.month(days)
+    keep = (months >= first) & (months <= last)
+    totals = np.bincount(months[keep] - first, weights=amounts[keep], minlength=24)
+    previous, current = totals[:12], totals[12:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = np.where(previous > 0, (current - previous) / previous * 100, np.nan)
+
+    return [{
+        'month': _month_label(first + 12 + i),
+        'current': round(float(current[i]), 2),
+        'previous': round(float(previous[i]), 2),
+        'change_pct': None if np.isnan(change[i]) else round(float(change[i]), 1),
+    } for i in range(12)]
+
+
+def category_trends(columns, user_id, end=None, months=TREND_MONTHS):
+    """Least-squares slope of monthly spend per category over the last `months` months"""
+    end = _today() if end is None else end
+    days, cats, amounts = _spend(columns, columns.rows(user_id))
+    last = int(columns.month([end])[0])
+    first = last - months + 1
+
+    month = columns.month(days)
+    keep = (month >= first) & (month <= last)
+    n_cats = len(columns.categories)
+    grid = np.bincount(cats[keep] * months + (month[keep] - first), weights=amounts[keep],
+                       minlength=n_cats * months).reshape(n_cats, months)
+
+    x = np.arange(months, dtype=np.float64)
+    x -= x.mean()
+    slopes = (grid - grid.mean(axis=1, keepdims=True)) @ x / (x @ x)
+    used = np.flatnonzero(grid.any(axis=1))
+
+    trends = [{
+        'category': columns.categories[c],
+        'slope_per_month': round(float(slopes[c]), 2),
+        'monthly': [round(float(v), 2) for v in grid[c]],
+    } for c in used]
+    trends.sort(key=lambda t: t['slope_per_month'], reverse=True)
+    return {'months': [_month_label(m) for m in range(first, last + 1)], 'categories': trends}
+
+
+def _user_zscores(columns):
+    """z-score of every spend row against its own user's mean and spread"""
+    spend = ~columns.income
+    n_users = len(columns.user_ids)
+    user = columns.user[spend]
+    amount = columns.amount[spend]
+    count = np.bincount(user, minlength=n_users)
+    total = np.bincount(user, weights=amount, minlength=n_users)
+    squares = np.bincount(user, weights=amount * amount, minlength=n_users)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = total / count
+        std = np.sqrt(np.maximum(squares / count - mean * mean, 0))
+        z = (amount - mean[user]) / std[user]
+    z[~np.isfinite(z)] = 0.0
+    return np.flatnonzero(spend), z
+
+
+def outliers(columns, user_id=None, threshold=OUTLIER_Z):
+    """Spend rows more than `threshold` standard deviations above the user's mean"""
+    index, z = _user_zscores(columns)
+    flagged = z > threshold
+    if user_id is not None:
+        code = columns.user_index.get(user_id, -1)
+        flagged &= columns.user[index] == code
+    rows = index[flagged]
+    return [{
+        'user_id': columns.user_ids[columns.user[r]],
+        'date': date.fromordinal(int(columns.day[r])).isoformat(),
+        'category': columns.categories[columns.category[r]],
+        'amount': round(float(columns.amount[r]), 2),
+        'z_score': round(float(zr), 2),
+    } for r, zr in zip(rows, z[flagged])]
+
+
+def user_report(columns, user_id, end=None):
+    return {
+        'user_id': user_id,
+        'rolling': rolling_averages(columns, user_id, end),
+        'year_over_year': year_over_year(columns, user_id, end),
+        'category_trends': category_trends(columns, user_id, end),
+        'outliers': outliers(columns, user_id),
+    }
+
+
+def cohort_report(columns, end=None):
+    """Per-user summary for every user, computed in one pass over the columns"""
+    end = _today() if end is None else end
+    n_users = len(columns.user_ids)
+    n_cats = len(columns.categories)
+    spend = ~columns.income
+    user = columns.user[spend]
+    amount = columns.amount[spend]
+    day = columns.day[spend]
+
+    total = np.bincount(user, weights=amount, minlength=n_users)
+    income = np.bincount(columns.user[columns.income], weights=np.abs(columns.amount[columns.income]), minlength=n_users)
+    averages = {}
+    for window in ROLLING_WINDOWS:
+        recent = (day > end - window) & (day <= end)
+        averages[window] = np.bincount(user[recent], weights=amount[recent], minlength=n_users) / window
+
+    by_category = np.bincount(user * n_cats + columns.category[spend], weights=amount,
+                              minlength=n_users * n_cats).reshape(n_users, n_cats)
+    top = by_category.argmax(axis=1) if n_cats else np.zeros(n_users, dtype=np.int64)
+
+    index, z = _user_zscores(columns)
+    outlier_count = np.bincount(columns.user[index[z > OUTLIER_Z]], minlength=n_users)
+
+    users = [{
+        'user_id': columns.user_ids[u],
+        'total_spent': round(float(total[u]), 2),
+        'total_income': round(float(income[u]), 2),
+        **{f'avg_daily_{w}d': round(float(averages[w][u]), 2) for w in ROLLING_WINDOWS},
+        'top_category': columns.categories[top[u]] if total[u] > 0 else None,
+        'outliers': int(outlier_count[u]),
+    } for u in range(n_users)]
+
+    return {
+        'end': date.fromordinal(end).isoformat(),
+        'users': users,
+        'total_spent': round(float(total.sum()), 2),
+        'median_user_spent': round(float(np.median(total)), 2) if n_users else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline expense reports')
+    parser.add_argument('expenses', nargs='?', default='expenses.json', help='path to expenses.json')
+    parser.add_argument('--user', help='report for a single user id (default: cohort report plus every user)')
+    parser.add_argument('--archive-dir', default=archive.ARCHIVE_DIR, help='archived expense segments')
+    parser.add_argument('--end', help='report end date, YYYY-MM-DD (default: today)')
+    parser.add_argument('--out', help='write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    end = date.fromisoformat(args.end).toordinal() if args.end else None
+    columns = ExpenseColumns.from_file(args.expenses, args.archive_dir)
+
+    if args.user:
+        report = user_report(columns, args.user, end)
+    else:
+        report = {
+            'cohort': cohort_report(columns, end),
+            'users': [user_report(columns, user_id, end) for user_id in columns.user_ids],
+        }
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
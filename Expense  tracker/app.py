@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, flash, session
 import json
 import os
 import uuid
@@ -6,35 +6,26 @@ import logging
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Set up Twilio for SMS reminders (we'll initialize the client later)
-try:
-    from twilio.rest import Client
-    TWILIO_AVAILABLE = True
-except ImportError:
-    TWILIO_AVAILABLE = False
-    logging.warning("Twilio package not installed. SMS reminders will be disabled.")
-
-# Twilio configuration (replace with your actual credentials in production)
-TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID', 'your_account_sid')
-TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN', 'your_auth_token')
-TWILIO_PHONE_NUMBER = os.environ.get('TWILIO_PHONE_NUMBER', '+1234567890')
-
-# Initialize Twilio client if available
-twilio_client = None
-if TWILIO_AVAILABLE and TWILIO_ACCOUNT_SID != 'your_account_sid':
-    try:
-        twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-    except Exception as e:
-        logging.error(f"Failed to initialize Twilio client: {e}")
-        TWILIO_AVAILABLE = False
+
+import archive
+import assets
+import compression
+import events
+import export
+import filelock
+import friend_graph
+import integrations
+import records
+import recurring
+import rollover
+import search
+import snapshot
+import water_stats
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here'  # Change this to a random secret key in production
+compression.init_app(app)
+assets.init_app(app)
 
 # File paths
 USERS_FILE = 'users.json'
@@ -44,6 +35,9 @@ WATER_FILE = 'water.json'
 NOTES_FILE = 'notes.json'
 FRIENDS_FILE = 'friends.json'
 
+# Read-only snapshots shared by all workers; the JSON files stay authoritative
+snapshots = snapshot.SnapshotStore()
+
 # Helper functions
 def load_users():
     if os.path.exists(USERS_FILE):
@@ -52,8 +46,8 @@ def load_users():
     return []
 
 def save_users(users):
-    with open(USERS_FILE, 'w') as f:
-        json.dump(users, f)
+    source = snapshot.write_source(USERS_FILE, users)
+    snapshots.publish('users', users, USERS_FILE, 'id', source)
 
 def load_expenses():
     if os.path.exists(EXPENSES_FILE):
@@ -62,8 +56,42 @@ def load_expenses():
     return []
 
 def save_expenses(expenses):
-    with open(EXPENSES_FILE, 'w') as f:
-        json.dump(expenses, f)
+    source = snapshot.write_source(EXPENSES_FILE, expenses)
+    snapshots.publish('expenses', expenses, EXPENSES_FILE, 'user_id', source)
+
+def load_user_records(store, user_id):
+    """A user's records from the shared snapshot, falling back to the JSON store"""
+    path, loader = {
+        'expenses': (EXPENSES_FILE, load_expenses),
+        'habits': (HABITS_FILE, load_habits),
+        'notes': (NOTES_FILE, load_notes),
+    }[store]
+    user_records = snapshots.get(store, user_id, path)
+    if user_records is None:
+        user_records = [record for record in loader() if record.get('user_id') == user_id]
+    return user_records
+
+def user_records_version(store, user_id):
+    """Changes whenever the user's records in `store` do (the whole file's signature without a snapshot)"""
+    path = {'expenses': EXPENSES_FILE, 'habits': HABITS_FILE, 'notes': NOTES_FILE}[store]
+    version = snapshots.version(store, user_id, path)
+    return version if version is not None else snapshot.signature(path)
+
+def get_user(user_id):
+    users = snapshots.get('users', user_id, USERS_FILE)
+    if users is None:
+        users = [user for user in load_users() if user['id'] == user_id]
+    return users[0] if users else None
+
+def load_user_expenses(user_id, start=None, end=None):
+    """A user's expenses, including archived ones, optionally limited to a date range"""
+    def in_range(expense):
+        day = str(expense.get('date', ''))[:10]
+        return not ((start and day < start) or (end and day > end))
+    
+    user_expenses = list(archive.iter_archived('expenses', user_id, start, end))
+    user_expenses.extend(expense for expense in load_user_records('expenses', user_id) if in_range(expense))
+    return user_expenses
 
 def load_habits():
     if os.path.exists(HABITS_FILE):
@@ -72,8 +100,8 @@ def load_habits():
     return []
 
 def save_habits(habits):
-    with open(HABITS_FILE, 'w') as f:
-        json.dump(habits, f)
+    source = snapshot.write_source(HABITS_FILE, habits)
+    snapshots.publish('habits', habits, HABITS_FILE, 'user_id', source)
 
 def load_water():
     if os.path.exists(WATER_FILE):
@@ -92,8 +120,8 @@ def load_notes():
     return []
 
 def save_notes(notes):
-    with open(NOTES_FILE, 'w') as f:
-        json.dump(notes, f)
+    source = snapshot.write_source(NOTES_FILE, notes)
+    snapshots.publish('notes', notes, NOTES_FILE, 'user_id', source)
 
 def load_friends():
     if os.path.exists(FRIENDS_FILE):
@@ -105,6 +133,50 @@ def save_friends(friends):
     with open(FRIENDS_FILE, 'w') as f:
         json.dump(friends, f)
 
+def add_friend_activity(user_id, activity, limit=None):
+    """Append `activity` to the feed of each of the user's friends and push it to them live"""
+    with filelock.locked(FRIENDS_FILE):
+        friends_data = load_friends()
+        friend_ids = friends_data.get(user_id, {}).get('friends', [])
+        if not friend_ids:
+            return
+        
+        for friend_id in friend_ids:
+            if friend_id not in friends_data:
+                friends_data[friend_id] = {'friends': [], 'activities': []}
+            
+            if 'activities' not in friends_data[friend_id]:
+                friends_data[friend_id]['activities'] = []
+            
+            friends_data[friend_id]['activities'].append(dict(activity))
+            
+            # Keep only the most recent `limit` activities
+            if limit and len(friends_data[friend_id]['activities']) > limit:
+                friends_data[friend_id]['activities'] = sorted(
+                    friends_data[friend_id]['activities'],
+                    key=lambda x: x.get('time', ''),
+                    reverse=True
+                )[:limit]
+        
+        save_friends(friends_data)
+    events.hub.publish(friend_ids, 'activity', activity)
+
+recurring_scheduler = recurring.Scheduler(load_expenses, save_expenses, EXPENSES_FILE)
+
+friend_graphs = friend_graph.FriendGraphIndex(FRIENDS_FILE, load_friends)
+
+daily_rollover = rollover.DailyRollover(load_habits, save_habits, load_water, save_water, HABITS_FILE, WATER_FILE)
+
+search_index = search.SearchIndex({
+    'note': ('note', lambda user_id: user_records_version('notes', user_id),
+             lambda user_id: load_user_records('notes', user_id)),
+    'expense': ('expense', lambda user_id: user_records_version('expenses', user_id),
+                lambda user_id: load_user_records('expenses', user_id)),
+    # Only re-read when the user's archived expenses change, and then only their own segments
+    'archived_expense': ('expense', lambda user_id: archive.user_stamp('expenses', user_id),
+                         lambda user_id: archive.iter_archived('expenses', user_id)),
+})
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -116,7 +188,8 @@ def login_required(f):
 
 def send_sms_reminder(to_number, message):
     """Send an SMS reminder using Twilio"""
-    if not TWILIO_AVAILABLE or not twilio_client:
+    sms = integrations.get('sms')
+    if sms is None:
         logging.warning("Twilio is not available. SMS not sent.")
         return False
     
@@ -125,11 +198,7 @@ def send_sms_reminder(to_number, message):
         return False
     
     try:
-        message = twilio_client.messages.create(
-            body=message,
-            from_=TWILIO_PHONE_NUMBER,
-            to=to_number
-        )
+        message = sms.send(to_number, message)
         logging.info(f"SMS sent successfully: {message.sid}")
         return True
     except Exception as e:
@@ -211,14 +280,15 @@ def signup():
         water_goal = int(weight * 0.033 * 1000)
         
         # Initialize water data for the new user
-        water_data = load_water()
-        water_data[new_user['id']] = {
-            'goal': water_goal,
-            'current': 0,
-            'history': [],
-            'last_update_date': datetime.now().strftime('%Y-%m-%d')
-        }
-        save_water(water_data)
+        with filelock.locked(WATER_FILE):
+            water_data = load_water()
+            water_data[new_user['id']] = {
+                'goal': water_goal,
+                'current': 0,
+                'history': [],
+                'last_update_date': datetime.now().strftime('%Y-%m-%d')
+            }
+            save_water(water_data)
         
         flash('Account created successfully! Please login.', 'success')
         return redirect(url_for('login'))
@@ -279,14 +349,15 @@ def profile():
                     
                     # Update water goal based on new weight
                     if old_weight != weight_value:
-                        water_data = load_water()
-                        if user['id'] in water_data:
-                            water_goal = int(weight_value * 0.033 * 1000)
-                            water_data[user['id']]['goal'] = water_goal
-                            save_water(water_data)
-                            flash(f'Weight updated and daily water goal adjusted to {water_goal} ml', 'success')
-                        else:
-                            flash('Weight updated successfully', 'success')
+                        with filelock.locked(WATER_FILE):
+                            water_data = load_water()
+                            if user['id'] in water_data:
+                                water_goal = int(weight_value * 0.033 * 1000)
+                                water_data[user['id']]['goal'] = water_goal
+                                save_water(water_data)
+                                flash(f'Weight updated and daily water goal adjusted to {water_goal} ml', 'success')
+                            else:
+                                flash('Weight updated successfully', 'success')
             except ValueError:
                 flash('Please enter a valid weight', 'error')
         
@@ -318,9 +389,10 @@ def expenses_page():
 @app.route('/expenses/data', methods=['GET'])
 @login_required
 def get_expenses():
-    expenses = load_expenses()
-    user_expenses = [expense for expense in expenses if expense.get('user_id') == session['user_id']]
-    return jsonify(user_expenses)
+    # Optional inclusive YYYY-MM-DD range; archived months outside it are never opened
+    start = request.args.get('start')
+    end = request.args.get('end')
+    return jsonify(load_user_expenses(session['user_id'], start, end))
 
 @app.route('/expenses/add', methods=['POST'])
 @login_required
@@ -330,12 +402,13 @@ def add_expense():
     if not data or 'description' not in data or 'amount' not in data:
         return jsonify({'error': 'Missing required fields'}), 400
     
-    expenses = load_expenses()
-    
     # Handle transaction type (expense or income)
     transaction_type = data.get('type', 'expense')
     # For income, store the amount as a negative value to differentiate
-    amount = float(data['amount'])
+    try:
+        amount = records.parse_amount(data['amount'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     if transaction_type == 'income':
         amount = -amount  # Store income as negative to differentiate from expenses
     
@@ -349,35 +422,42 @@ def add_expense():
         'type': transaction_type
     }
     
-    expenses.append(new_expense)
-    save_expenses(expenses)
+    # This expense is the first occurrence; the scheduler adds the following ones
+    if data.get('recurring'):
+        try:
+            start = datetime.strptime(new_expense['date'][:10], '%Y-%m-%d').date()
+            rule = recurring.new_rule(data, start)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        rule['occurrences'] = 1
+        rule['next_due'] = recurring.occurrence(start, rule['frequency'], 1).isoformat()
+        
+        with recurring.locked():
+            rules = recurring.load_rules()
+            rules.setdefault(session['user_id'], []).append(rule)
+            recurring.save_rules(rules)
+        
+        new_expense['recurring'] = True
+        new_expense['recurring_interval'] = rule['frequency']
+        new_expense['recurring_rule_id'] = rule['id']
+    
+    with filelock.locked(EXPENSES_FILE):
+        expenses = load_expenses()
+        expenses.append(new_expense)
+        save_expenses(expenses)
+    search_index.put('expense', new_expense)
+    events.hub.publish(session['user_id'], 'change', {'store': 'expenses', 'action': 'add', 'id': new_expense['id']})
     
     # Add activity for friends to see
-    user_id = session['user_id']
-    friends_data = load_friends()
-    if user_id in friends_data and 'friends' in friends_data[user_id]:
-        users = load_users()
-        current_user = next((user for user in users if user['id'] == user_id), None)
-        
-        if current_user:
-            # Don't show the exact amount for privacy
-            activity_description = f"Added a new {transaction_type}: {data['description']} in {data.get('category', 'Uncategorized')}"
-            
-            # Add activity to each friend's feed
-            for friend_id in friends_data[user_id]['friends']:
-                if friend_id not in friends_data:
-                    friends_data[friend_id] = {'friends': [], 'activities': []}
-                
-                if 'activities' not in friends_data[friend_id]:
-                    friends_data[friend_id]['activities'] = []
-                
-                friends_data[friend_id]['activities'].append({
-                    'username': current_user['username'],
-                    'time': datetime.now().strftime('%Y-%m-%d %H:%M'),
-                    'description': activity_description
-                })
-            
-            save_friends(friends_data)
+    current_user = get_user(session['user_id'])
+    if current_user:
+        # Don't show the exact amount for privacy
+        activity_description = f"Added a new {transaction_type}: {data['description']} in {data.get('category', 'Uncategorized')}"
+        add_friend_activity(session['user_id'], {
+            'username': current_user['username'],
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M'),
+            'description': activity_description
+        })
     
     return jsonify(new_expense), 201
 
@@ -385,36 +465,145 @@ def add_expense():
 @login_required
 def update_expense(expense_id):
     data = request.get_json()
-    expenses = load_expenses()
-    
-    for expense in expenses:
-        if expense.get('id') == expense_id and expense.get('user_id') == session['user_id']:
-            if 'description' in data:
-                expense['description'] = data['description']
-            if 'amount' in data:
-                expense['amount'] = float(data['amount'])
-            if 'category' in data:
-                expense['category'] = data['category']
-            if 'date' in data:
-                expense['date'] = data['date']
-            
+    
+    changes = {}
+    if 'description' in data:
+        changes['description'] = data['description']
+    if 'amount' in data:
+        try:
+            changes['amount'] = records.parse_amount(data['amount'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    if 'category' in data:
+        changes['category'] = data['category']
+    if 'date' in data:
+        changes['date'] = data['date']
+    
+    source = 'expense'
+    with filelock.locked(EXPENSES_FILE):
+        expenses = load_expenses()
+        expense = next((expense for expense in expenses
+                        if expense.get('id') == expense_id and expense.get('user_id') == session['user_id']), None)
+        if expense is not None:
+            expense.update(changes)
             save_expenses(expenses)
-            return jsonify(expense)
     
-    return jsonify({'error': 'Expense not found or unauthorized'}), 404
+    # Older expenses live in the archive, which /expenses/data also lists
+    if expense is None:
+        source = 'archived_expense'
+        expense = archive.update_archived('expenses', session['user_id'], expense_id, changes)
+        if expense is None:
+            return jsonify({'error': 'Expense not found or unauthorized'}), 404
+    
+    search_index.put(source, expense)
+    return jsonify(expense)
 
 @app.route('/expenses/<expense_id>', methods=['DELETE'])
 @login_required
 def delete_expense(expense_id):
-    expenses = load_expenses()
-    
-    for i, expense in enumerate(expenses):
-        if expense.get('id') == expense_id and expense.get('user_id') == session['user_id']:
-            del expenses[i]
+    with filelock.locked(EXPENSES_FILE):
+        expenses = load_expenses()
+        index = next((i for i, expense in enumerate(expenses)
+                      if expense.get('id') == expense_id and expense.get('user_id') == session['user_id']), None)
+        if index is not None:
+            del expenses[index]
             save_expenses(expenses)
-            return jsonify({'message': 'Expense deleted successfully'})
     
-    return jsonify({'error': 'Expense not found or unauthorized'}), 404
+    source = 'expense'
+    if index is None:
+        source = 'archived_expense'
+        if not archive.delete_archived('expenses', session['user_id'], expense_id):
+            return jsonify({'error': 'Expense not found or unauthorized'}), 404
+    
+    search_index.discard(source, session['user_id'], expense_id)
+    return jsonify({'message': 'Expense deleted successfully'})
+
+# Recurring expense routes
+@app.route('/expenses/recurring', methods=['GET'])
+@login_required
+def get_recurring_rules():
+    rules = recurring.load_rules()
+    return jsonify(rules.get(session['user_id'], []))
+
+@app.route('/expenses/recurring', methods=['POST'])
+@login_required
+def add_recurring_rule():
+    data = request.get_json()
+    
+    if not data or 'description' not in data or 'amount' not in data:
+        return jsonify({'error': 'Missing required fields'}), 400
+    
+    try:
+        start = datetime.strptime(data.get('start_date', datetime.now().strftime('%Y-%m-%d')), '%Y-%m-%d').date()
+        rule = recurring.new_rule(data, start)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    with recurring.locked():
+        rules = recurring.load_rules()
+        rules.setdefault(session['user_id'], []).append(rule)
+        recurring.save_rules(rules)
+    
+    # Materialise anything already due (e.g. a start date in the past) right away
+    recurring_scheduler.tick()
+    
+    # The tick advanced occurrences and next_due in the stored copy
+    stored = next((r for r in recurring.load_rules().get(session['user_id'], []) if r['id'] == rule['id']), rule)
+    return jsonify(stored), 201
+
+@app.route('/expenses/recurring/<rule_id>', methods=['DELETE'])
+@login_required
+def delete_recurring_rule(rule_id):
+    with recurring.locked():
+        rules = recurring.load_rules()
+        user_rules = rules.get(session['user_id'], [])
+        
+        for i, rule in enumerate(user_rules):
+            if rule['id'] == rule_id:
+                del user_rules[i]
+                recurring.save_rules(rules)
+                return jsonify({'message': 'Recurring expense deleted successfully'})
+    
+    return jsonify({'error': 'Recurring expense not found or unauthorized'}), 404
+
+# Expense report routes
+def _expense_reports():
+    # numpy is only imported once a report is actually requested
+    try:
+        import analytics
+    except ImportError:
+        logging.warning("NumPy not installed. Expense reports are disabled.")
+        return None
+    return analytics
+
+@app.route('/expenses/reports', methods=['GET'])
+@login_required
+def get_expense_reports():
+    analytics = _expense_reports()
+    if analytics is None:
+        return jsonify({'error': 'Reports are not available'}), 503
+    
+    columns = analytics.ExpenseColumns(load_user_expenses(session['user_id']))
+    return jsonify(analytics.user_report(columns, session['user_id']))
+
+@app.route('/expenses/reports/<report>', methods=['GET'])
+@login_required
+def get_expense_report(report):
+    analytics = _expense_reports()
+    if analytics is None:
+        return jsonify({'error': 'Reports are not available'}), 503
+    
+    reports = {
+        'rolling': analytics.rolling_averages,
+        'year-over-year': analytics.year_over_year,
+        'trends': analytics.category_trends,
+        'outliers': analytics.outliers,
+    }
+    if report not in reports:
+        return jsonify({'error': 'Unknown report'}), 404
+    
+    columns = analytics.ExpenseColumns(load_user_expenses(session['user_id']))
+    return jsonify(reports[report](columns, session['user_id']))
 
 # Habit routes
 @app.route('/habits')
@@ -425,9 +614,12 @@ def habits_page():
 @app.route('/habits/data', methods=['GET'])
 @login_required
 def get_habits():
-    habits = load_habits()
-    user_habits = [habit for habit in habits if habit.get('user_id') == session['user_id']]
-    return jsonify(user_habits)
+    habits = load_user_records('habits', session['user_id'])
+    # Stored streaks are as of the last rollover or toggle
+    today = datetime.now().date()
+    for habit in habits:
+        habit['streak'] = rollover.habit_streak(habit, today)
+    return jsonify(habits)
 
 @app.route('/habits/add', methods=['POST'])
 @login_required
@@ -437,8 +629,6 @@ def add_habit():
     if not data or 'name' not in data or 'category' not in data or 'frequency' not in data:
         return jsonify({'error': 'Missing required fields'}), 400
     
-    habits = load_habits()
-    
     new_habit = {
         'id': str(uuid.uuid4()),
         'user_id': session['user_id'],
@@ -450,80 +640,84 @@ def add_habit():
         'streak': 0
     }
     
-    habits.append(new_habit)
-    save_habits(habits)
+    with filelock.locked(HABITS_FILE):
+        habits = load_habits()
+        habits.append(new_habit)
+        save_habits(habits)
     
     return jsonify(new_habit), 201
 
 @app.route('/habits/<habit_id>/toggle', methods=['POST'])
 @login_required
 def toggle_habit(habit_id):
-    habits = load_habits()
     today = datetime.now().strftime('%Y-%m-%d')
     user_id = session['user_id']
     
-    for habit in habits:
-        if habit.get('id') == habit_id and habit.get('user_id') == user_id:
-            if 'completedDates' not in habit:
-                habit['completedDates'] = []
-            
-            completed = False
-            if today in habit['completedDates']:
-                habit['completedDates'].remove(today)
-                # Decrease streak if it was completed today
-                if habit.get('streak', 0) > 0:
-                    habit['streak'] -= 1
-            else:
-                habit['completedDates'].append(today)
-                # Increase streak
-                habit['streak'] = habit.get('streak', 0) + 1
-                completed = True
-            
-            save_habits(habits)
-            
-            # Add activity for friends to see
-            friends_data = load_friends()
-            if user_id in friends_data and 'friends' in friends_data[user_id]:
-                users = load_users()
-                current_user = next((user for user in users if user['id'] == user_id), None)
-                
-                if current_user:
-                    activity_description = f"{'Completed' if completed else 'Uncompleted'} habit: {habit.get('name', 'Unknown')}"
-                    
-                    # Add activity to each friend's feed
-                    for friend_id in friends_data[user_id]['friends']:
-                        if friend_id not in friends_data:
-                            friends_data[friend_id] = {'friends': [], 'activities': []}
-                        
-                        if 'activities' not in friends_data[friend_id]:
-                            friends_data[friend_id]['activities'] = []
-                        
-                        friends_data[friend_id]['activities'].append({
-                            'username': current_user['username'],
-                            'time': datetime.now().strftime('%Y-%m-%d %H:%M'),
-                            'description': activity_description
-                        })
-                    
-                    save_friends(friends_data)
-            
-            return jsonify(habit)
+    with filelock.locked(HABITS_FILE):
+        habits = load_habits()
+        habit = next((habit for habit in habits
+                      if habit.get('id') == habit_id and habit.get('user_id') == user_id), None)
+        if habit is None:
+            return jsonify({'error': 'Habit not found or unauthorized'}), 404
+        
+        if 'completedDates' not in habit:
+            habit['completedDates'] = []
+        
+        completed = False
+        if today in habit['completedDates']:
+            habit['completedDates'].remove(today)
+        else:
+            habit['completedDates'].append(today)
+            completed = True
+        
+        # Streaks count days or weeks depending on the habit's frequency
+        habit['streak'] = rollover.habit_streak(habit, datetime.now().date())
+        
+        save_habits(habits)
     
-    return jsonify({'error': 'Habit not found or unauthorized'}), 404
+    events.hub.publish(user_id, 'change', {'store': 'habits', 'action': 'toggle', 'id': habit_id})
+    
+    # Add activity for friends to see
+    current_user = get_user(user_id)
+    if current_user:
+        activity_description = f"{'Completed' if completed else 'Uncompleted'} habit: {habit.get('name', 'Unknown')}"
+        add_friend_activity(user_id, {
+            'username': current_user['username'],
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M'),
+            'description': activity_description
+        })
+    
+    return jsonify(habit)
 
 @app.route('/habits/<habit_id>', methods=['DELETE'])
 @login_required
 def delete_habit(habit_id):
-    habits = load_habits()
-    
-    for i, habit in enumerate(habits):
-        if habit.get('id') == habit_id and habit.get('user_id') == session['user_id']:
-            del habits[i]
-            save_habits(habits)
-            return jsonify({'message': 'Habit deleted successfully'})
+    with filelock.locked(HABITS_FILE):
+        habits = load_habits()
+        
+        for i, habit in enumerate(habits):
+            if habit.get('id') == habit_id and habit.get('user_id') == session['user_id']:
+                del habits[i]
+                save_habits(habits)
+                return jsonify({'message': 'Habit deleted successfully'})
     
     return jsonify({'error': 'Habit not found or unauthorized'}), 404
 
 # Water tracker routes
+def water_response(user_water):
+    # Older water.json files still carry the rollup inline until the user's next update
+    return {key: value for key, value in user_water.items() if key != 'rollup'}
+
+def water_rollup(user_id, user_water, today):
+    """The user's water rollup, built once from their (archived and hot) history if missing"""
+    # Rollups now live in their own store; drop the copy older versions kept in water.json
+    user_water.pop('rollup', None)
+    rollup = water_stats.load(user_id)
+    if rollup is None:
+        history = list(archive.iter_archived('water', user_id)) + user_water.get('history', [])
+        rollup = water_stats.rebuild(history, user_water.get('goal', 2000), today)
+    return rollup
+
 @app.route('/water')
 @login_required
 def water_page():
@@ -532,42 +726,43 @@ def water_page():
 @app.route('/water/data', methods=['GET'])
 @login_required
 def get_water_data():
-    water_data = load_water()
     user_id = session['user_id']
     today = datetime.now().strftime('%Y-%m-%d')
     
     # Get user data to access weight
-    users = load_users()
-    current_user = next((user for user in users if user['id'] == user_id), None)
+    current_user = get_user(user_id)
     
-    if user_id not in water_data:
-        # Calculate water goal based on weight if available
-        water_goal = 2000  # Default goal in ml
-        if current_user and 'weight' in current_user:
-            water_goal = int(float(current_user['weight']) * 0.033 * 1000)
-        
-        water_data[user_id] = {
-            'goal': water_goal,
-            'current': 0,
-            'history': [],
-            'last_update_date': today
-        }
-        save_water(water_data)
-    else:
-        # Update goal if user weight has changed
-        if current_user and 'weight' in current_user:
-            calculated_goal = int(float(current_user['weight']) * 0.033 * 1000)
-            if water_data[user_id]['goal'] != calculated_goal:
-                water_data[user_id]['goal'] = calculated_goal
+    with filelock.locked(WATER_FILE):
+        water_data = load_water()
+        
+        if user_id not in water_data:
+            # Calculate water goal based on weight if available
+            water_goal = 2000  # Default goal in ml
+            if current_user and 'weight' in current_user:
+                water_goal = int(float(current_user['weight']) * 0.033 * 1000)
+            
+            water_data[user_id] = {
+                'goal': water_goal,
+                'current': 0,
+                'history': [],
+                'last_update_date': today
+            }
+            save_water(water_data)
+        else:
+            # Check if it's a new day and reset water count if needed
+            changed = rollover.finalize_water(water_data[user_id], datetime.now().date())
+            
+            # Update goal if user weight has changed
+            if current_user and 'weight' in current_user:
+                calculated_goal = int(float(current_user['weight']) * 0.033 * 1000)
+                if water_data[user_id]['goal'] != calculated_goal:
+                    water_data[user_id]['goal'] = calculated_goal
+                    changed = True
+            
+            if changed:
                 save_water(water_data)
     
-    # Check if it's a new day and reset water count if needed
-    if water_data[user_id].get('last_update_date') != today:
-        water_data[user_id]['current'] = 0
-        water_data[user_id]['last_update_date'] = today
-        save_water(water_data)
-    
-    return jsonify(water_data[user_id])
+    return jsonify(water_response(water_data[user_id]))
 
 @app.route('/water/update', methods=['POST'])
 @login_required
@@ -577,82 +772,64 @@ def update_water():
     if not data or 'amount' not in data:
         return jsonify({'error': 'Missing required fields'}), 400
     
-    water_data = load_water()
     user_id = session['user_id']
     today = datetime.now().strftime('%Y-%m-%d')
     
-    if user_id not in water_data:
-        water_data[user_id] = {
-            'goal': 2000,  # Default goal in ml
-            'current': 0,
-            'history': [],
-            'last_update_date': today
-        }
-    
-    # Check if it's a new day and reset water count if needed
-    if water_data[user_id].get('last_update_date') != today:
-        water_data[user_id]['current'] = 0
-        # Don't update with the old amount if it's a new day
+    with filelock.locked(WATER_FILE):
+        water_data = load_water()
+        
+        if user_id not in water_data:
+            water_data[user_id] = {
+                'goal': 2000,  # Default goal in ml
+                'current': 0,
+                'history': [],
+                'last_update_date': today
+            }
+        
+        # Check if it's a new day and reset water count if needed
+        rollover.finalize_water(water_data[user_id], datetime.now().date())
+        
+        old_amount = water_data[user_id]['current']
+        water_data[user_id]['current'] = int(data['amount'])
         water_data[user_id]['last_update_date'] = today
-    
-    old_amount = water_data[user_id]['current']
-    water_data[user_id]['current'] = int(data['amount'])
-    water_data[user_id]['last_update_date'] = today
-    
-    # Update history
-    history_entry = next((entry for entry in water_data[user_id]['history'] if entry['date'] == today), None)
-    
-    if history_entry:
-        history_entry['amount'] = water_data[user_id]['current']
-    else:
-        water_data[user_id]['history'].append({
-            'date': today,
-            'amount': water_data[user_id]['current']
-        })
-    
-    save_water(water_data)
+        
+        # Update history
+        history_entry = next((entry for entry in water_data[user_id]['history'] if entry['date'] == today), None)
+        
+        if history_entry:
+            history_entry['amount'] = water_data[user_id]['current']
+        else:
+            water_data[user_id]['history'].append({
+                'date': today,
+                'amount': water_data[user_id]['current']
+            })
+        
+        today_ordinal = datetime.now().date().toordinal()
+        rollup = water_rollup(user_id, water_data[user_id], today_ordinal)
+        water_stats.record(rollup, today_ordinal, water_data[user_id]['current'], water_data[user_id]['goal'])
+        water_stats.save(user_id, rollup)
+        
+        save_water(water_data)
+    events.hub.publish(user_id, 'change', {'store': 'water', 'action': 'update', 'current': water_data[user_id]['current']})
     
     # Add activity for friends to see if significant change (more than 250ml)
     if abs(water_data[user_id]['current'] - old_amount) >= 250:
-        friends_data = load_friends()
-        if user_id in friends_data and 'friends' in friends_data[user_id]:
-            users = load_users()
-            current_user = next((user for user in users if user['id'] == user_id), None)
+        current_user = get_user(user_id)
+        if current_user:
+            # Calculate percentage of goal
+            goal = water_data[user_id]['goal']
+            current = water_data[user_id]['current']
+            percentage = min(100, int((current / goal) * 100)) if goal > 0 else 0
             
-            if current_user:
-                # Calculate percentage of goal
-                goal = water_data[user_id]['goal']
-                current = water_data[user_id]['current']
-                percentage = min(100, int((current / goal) * 100)) if goal > 0 else 0
-                
-                activity_description = f"Updated water intake to {current}ml ({percentage}% of daily goal)"
-                
-                # Add activity to each friend's feed
-                for friend_id in friends_data[user_id]['friends']:
-                    if friend_id not in friends_data:
-                        friends_data[friend_id] = {'friends': [], 'activities': []}
-                    
-                    if 'activities' not in friends_data[friend_id]:
-                        friends_data[friend_id]['activities'] = []
-                    
-                    # Add new activity
-                    friends_data[friend_id]['activities'].append({
-                        'username': current_user['username'],
-                        'time': datetime.now().strftime('%Y-%m-%d %H:%M'),
-                        'description': activity_description
-                    })
-                    
-                    # Limit to most recent 50 activities
-                    if len(friends_data[friend_id]['activities']) > 50:
-                        friends_data[friend_id]['activities'] = sorted(
-                            friends_data[friend_id]['activities'],
-                            key=lambda x: x.get('time', ''),
-                            reverse=True
-                        )[:50]
-                
-                save_friends(friends_data)
-    
-    return jsonify(water_data[user_id])
+            activity_description = f"Updated water intake to {current}ml ({percentage}% of daily goal)"
+            # Limit to most recent 50 activities
+            add_friend_activity(user_id, {
+                'username': current_user['username'],
+                'time': datetime.now().strftime('%Y-%m-%d %H:%M'),
+                'description': activity_description
+            }, limit=50)
+    
+    return jsonify(water_response(water_data[user_id]))
 
 @app.route('/water/goal', methods=['POST'])
 @login_required
@@ -662,34 +839,60 @@ def update_water_goal():
     if not data or 'goal' not in data:
         return jsonify({'error': 'Missing required fields'}), 400
     
-    water_data = load_water()
     user_id = session['user_id']
     today = datetime.now().strftime('%Y-%m-%d')
     
-    if user_id not in water_data:
-        water_data[user_id] = {
-            'goal': 2000,
-            'current': 0,
-            'history': [],
-            'last_update_date': today
-        }
-    
-    # Check if it's a new day and reset water count if needed
-    if water_data[user_id].get('last_update_date') != today:
-        water_data[user_id]['current'] = 0
-        water_data[user_id]['last_update_date'] = today
+    with filelock.locked(WATER_FILE):
+        water_data = load_water()
+        
+        if user_id not in water_data:
+            water_data[user_id] = {
+                'goal': 2000,
+                'current': 0,
+                'history': [],
+                'last_update_date': today
+            }
+        
+        # Check if it's a new day and reset water count if needed
+        rollover.finalize_water(water_data[user_id], datetime.now().date())
+        
+        water_data[user_id]['goal'] = int(data['goal'])
+        
+        # Whether today's goal is met depends on the new goal (if anything was logged today)
+        today_ordinal = datetime.now().date().toordinal()
+        rollup = water_rollup(user_id, water_data[user_id], today_ordinal)
+        water_stats.set_goal(rollup, today_ordinal, water_data[user_id]['current'], water_data[user_id]['goal'])
+        water_stats.save(user_id, rollup)
+        
+        save_water(water_data)
     
-    water_data[user_id]['goal'] = int(data['goal'])
-    save_water(water_data)
+    return jsonify(water_response(water_data[user_id]))
+
+@app.route('/water/stats', methods=['GET'])
+@login_required
+def get_water_stats():
+    water_data = load_water()
+    user_id = session['user_id']
     
-    return jsonify(water_data[user_id])
+    if user_id not in water_data:
+        return jsonify({'error': 'Water data not found'}), 404
+    
+    today_ordinal = datetime.now().date().toordinal()
+    rollup = water_stats.load(user_id)
+    if rollup is None:
+        with filelock.locked(WATER_FILE):
+            rollup = water_rollup(user_id, load_water()[user_id], today_ordinal)
+            water_stats.save(user_id, rollup)
+    
+    stats = water_stats.summary(rollup, today_ordinal)
+    stats['goal'] = water_data[user_id]['goal']
+    return jsonify(stats)
 
 @app.route('/water/send-reminder', methods=['POST'])
 @login_required
 def send_water_reminder():
     """Send an SMS reminder to drink water"""
-    users = load_users()
-    user = next((user for user in users if user['id'] == session['user_id']), None)
+    user = get_user(session['user_id'])
     
     if not user or not user.get('mobile'):
         return jsonify({'success': False, 'message': 'No mobile number found'}), 400
@@ -700,8 +903,8 @@ def send_water_reminder():
     if user_id not in water_data:
         return jsonify({'success': False, 'message': 'Water data not found'}), 404
     
-    # Calculate remaining water needed
-    current = water_data[user_id]['current']
+    # Calculate remaining water needed (nothing logged yet if the last update was before today)
+    current = water_data[user_id]['current'] if water_data[user_id].get('last_update_date') == datetime.now().strftime('%Y-%m-%d') else 0
     goal = water_data[user_id]['goal']
     remaining = max(0, goal - current)
     
@@ -730,30 +933,32 @@ def community_page():
     
     # Initialize friends data if not exists
     if user_id not in friends_data:
-        friends_data[user_id] = {
-            'friends': [],
-            'activities': []
-        }
-        save_friends(friends_data)
+        with filelock.locked(FRIENDS_FILE):
+            friends_data = load_friends()
+            friends_data.setdefault(user_id, {
+                'friends': [],
+                'activities': []
+            })
+            save_friends(friends_data)
     
-    # Get user data for all friends
-    users = load_users()
     water_data = load_water()
-    habits_data = load_habits()
+    today = datetime.now().date()
+    
+    graph = friend_graphs.get()
+    mutual_counts = graph.mutual_counts(user_id, friends_data[user_id]['friends'])
     
     friends = []
     for friend_id in friends_data[user_id]['friends']:
-        friend = next((user for user in users if user['id'] == friend_id), None)
+        friend = get_user(friend_id)
         if friend:
             # Get friend's habit streak
             habit_streak = 0
-            for habit in habits_data:
-                if habit.get('user_id') == friend_id:
-                    habit_streak = max(habit_streak, habit.get('streak', 0))
+            for habit in load_user_records('habits', friend_id):
+                habit_streak = max(habit_streak, rollover.habit_streak(habit, today))
             
-            # Get friend's water percentage
+            # Get friend's water percentage (today's, so a count left over from an earlier day is 0)
             water_percentage = 0
-            if friend_id in water_data:
+            if friend_id in water_data and water_data[friend_id].get('last_update_date') == today.isoformat():
                 water_goal = water_data[friend_id].get('goal', 2000)
                 water_current = water_data[friend_id].get('current', 0)
                 water_percentage = min(100, int((water_current / water_goal) * 100)) if water_goal > 0 else 0
@@ -763,7 +968,8 @@ def community_page():
                 'username': friend['username'],
                 'added_at': friends_data[user_id].get('added_dates', {}).get(friend_id, 'Unknown'),
                 'habit_streak': habit_streak,
-                'water_percentage': water_percentage
+                'water_percentage': water_percentage,
+                'mutual_friends': mutual_counts[friend_id]
             })
     
     # Get friend activities (limit to most recent 20)
@@ -796,68 +1002,41 @@ def add_friend():
     if friend_id == user_id:
         return jsonify({'success': False, 'message': 'You cannot add yourself as a friend'}), 400
     
-    # Load friends data
-    friends_data = load_friends()
-    
-    # Initialize if not exists
-    if user_id not in friends_data:
-        friends_data[user_id] = {
-            'friends': [],
-            'activities': [],
-            'added_dates': {}
-        }
-    
-    # Check if already friends
-    if friend_id in friends_data[user_id]['friends']:
-        return jsonify({'success': False, 'message': 'Already friends with this user'}), 400
-    
-    # Add friend
-    friends_data[user_id]['friends'].append(friend_id)
-    
-    # Add date when added
-    if 'added_dates' not in friends_data[user_id]:
-        friends_data[user_id]['added_dates'] = {}
-    
-    friends_data[user_id]['added_dates'][friend_id] = datetime.now().strftime('%Y-%m-%d')
-    
-    # Add activity
-    if 'activities' not in friends_data[user_id]:
-        friends_data[user_id]['activities'] = []
-    
-    friends_data[user_id]['activities'].append({
-        'username': friend['username'],
-        'time': datetime.now().strftime('%Y-%m-%d %H:%M'),
-        'description': f"You added {friend['username']} as a friend"
-    })
-    
-    # Also add the current user as a friend to the other user (bidirectional)
-    if friend_id not in friends_data:
-        friends_data[friend_id] = {
-            'friends': [],
-            'activities': [],
-            'added_dates': {}
-        }
-    
-    current_user = next((user for user in users if user['id'] == user_id), None)
-    
-    if user_id not in friends_data[friend_id]['friends']:
-        friends_data[friend_id]['friends'].append(user_id)
+    with filelock.locked(FRIENDS_FILE):
+        # Load friends data
+        friends_data = load_friends()
         
-        if 'added_dates' not in friends_data[friend_id]:
-            friends_data[friend_id]['added_dates'] = {}
+        graph = friend_graphs.get()
         
-        friends_data[friend_id]['added_dates'][user_id] = datetime.now().strftime('%Y-%m-%d')
+        # Check if already friends
+        if graph.are_friends(user_id, friend_id):
+            return jsonify({'success': False, 'message': 'Already friends with this user'}), 400
         
-        if 'activities' not in friends_data[friend_id]:
-            friends_data[friend_id]['activities'] = []
+        # Add friend on both sides (bidirectional)
+        friend_graphs.link(friends_data, user_id, friend_id, datetime.now().strftime('%Y-%m-%d'))
         
-        friends_data[friend_id]['activities'].append({
+        # Add activity
+        current_user = next((user for user in users if user['id'] == user_id), None)
+        
+        own_activity = {
+            'username': friend['username'],
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M'),
+            'description': f"You added {friend['username']} as a friend"
+        }
+        friend_activity = {
             'username': current_user['username'],
             'time': datetime.now().strftime('%Y-%m-%d %H:%M'),
             'description': f"{current_user['username']} added you as a friend"
-        })
+        }
+        friends_data[user_id].setdefault('activities', []).append(own_activity)
+        friends_data[friend_id].setdefault('activities', []).append(friend_activity)
+        
+        save_friends(friends_data)
+        friend_graphs.saved()
     
-    save_friends(friends_data)
+    events.hub.publish(user_id, 'activity', own_activity)
+    events.hub.publish(friend_id, 'activity', friend_activity)
+    events.hub.publish((user_id, friend_id), 'change', {'store': 'friends', 'action': 'add'})
     
     return jsonify({'success': True, 'message': 'Friend added successfully'})
 
@@ -871,54 +1050,106 @@ def remove_friend():
     if not friend_id:
         return jsonify({'success': False, 'message': 'Friend ID is required'}), 400
     
-    # Load friends data
-    friends_data = load_friends()
-    
-    # Check if user has friends data
-    if user_id not in friends_data or 'friends' not in friends_data[user_id]:
-        return jsonify({'success': False, 'message': 'No friends data found'}), 404
-    
-    # Check if they are friends
-    if friend_id not in friends_data[user_id]['friends']:
-        return jsonify({'success': False, 'message': 'Not friends with this user'}), 400
-    
-    # Get usernames for activity
-    users = load_users()
-    friend = next((user for user in users if user['id'] == friend_id), None)
-    current_user = next((user for user in users if user['id'] == user_id), None)
+    with filelock.locked(FRIENDS_FILE):
+        # Load friends data
+        friends_data = load_friends()
+        
+        # Check if user has friends data
+        if user_id not in friends_data or 'friends' not in friends_data[user_id]:
+            return jsonify({'success': False, 'message': 'No friends data found'}), 404
+        
+        graph = friend_graphs.get()
+        
+        # Check if they are friends
+        if not graph.are_friends(user_id, friend_id):
+            return jsonify({'success': False, 'message': 'Not friends with this user'}), 400
+        
+        # Get usernames for activity
+        friend = get_user(friend_id)
+        current_user = get_user(user_id)
+        
+        # Remove friend on both sides (bidirectional)
+        friend_graphs.unlink(friends_data, user_id, friend_id)
+        
+        # Add activity
+        if friend:
+            friends_data[user_id].setdefault('activities', []).append({
+                'username': friend['username'],
+                'time': datetime.now().strftime('%Y-%m-%d %H:%M'),
+                'description': f"You removed {friend['username']} from your friends"
+            })
+        
+        if current_user and friend_id in friends_data:
+            friends_data[friend_id].setdefault('activities', []).append({
+                'username': current_user['username'],
+                'time': datetime.now().strftime('%Y-%m-%d %H:%M'),
+                'description': f"{current_user['username']} removed you from their friends"
+            })
+        
+        save_friends(friends_data)
+        friend_graphs.saved()
     
-    # Remove friend
-    friends_data[user_id]['friends'].remove(friend_id)
+    return jsonify({'success': True, 'message': 'Friend removed successfully'})
+
+@app.route('/community/suggestions', methods=['GET'])
+@login_required
+def get_friend_suggestions():
+    """People you may know: friends of friends ranked by mutual friends"""
+    try:
+        limit = min(50, max(1, int(request.args.get('limit', 10))))
+    except ValueError:
+        limit = 10
+    
+    graph = friend_graphs.get()
+    suggestions = []
+    for candidate_id, mutual_count in graph.suggestions(session['user_id'], limit):
+        candidate = get_user(candidate_id)
+        if candidate:
+            suggestions.append({
+                'id': candidate_id,
+                'username': candidate['username'],
+                'mutual_friends': mutual_count
+            })
     
-    # Add activity
-    if 'activities' not in friends_data[user_id]:
-        friends_data[user_id]['activities'] = []
+    return jsonify(suggestions)
+
+@app.route('/community/mutual/<other_id>', methods=['GET'])
+@login_required
+def get_mutual_friends(other_id):
+    graph = friend_graphs.get()
+    mutual = []
+    for friend_id in graph.mutual(session['user_id'], other_id):
+        friend = get_user(friend_id)
+        if friend:
+            mutual.append({'id': friend_id, 'username': friend['username']})
     
-    if friend:
-        friends_data[user_id]['activities'].append({
-            'username': friend['username'],
-            'time': datetime.now().strftime('%Y-%m-%d %H:%M'),
-            'description': f"You removed {friend['username']} from your friends"
+    return jsonify({'count': len(mutual), 'friends': mutual})
+
+@app.route('/community/leaderboard', methods=['GET'])
+@login_required
+def get_leaderboard():
+    """Habit and water streaks of the user and their friends, as of the last daily rollover"""
+    user_id = session['user_id']
+    friends_data = load_friends()
+    board = rollover.load_leaderboard()
+    
+    entries = []
+    for member_id in [user_id] + friends_data.get(user_id, {}).get('friends', []):
+        member = get_user(member_id)
+        if not member:
+            continue
+        stats = board['users'].get(member_id, {})
+        entries.append({
+            'id': member_id,
+            'username': member['username'],
+            'habit_streak': stats.get('habit_streak', 0),
+            'water_streak': stats.get('water_streak', 0),
+            'water_best_streak': stats.get('water_best_streak', 0),
+            'water_goal_hit_rate': stats.get('water_goal_hit_rate', 0.0),
         })
     
-    # Also remove the current user from the other user's friends (bidirectional)
-    if friend_id in friends_data and 'friends' in friends_data[friend_id]:
-        if user_id in friends_data[friend_id]['friends']:
-            friends_data[friend_id]['friends'].remove(user_id)
-            
-            if 'activities' not in friends_data[friend_id]:
-                friends_data[friend_id]['activities'] = []
-            
-            if current_user:
-                friends_data[friend_id]['activities'].append({
-                    'username': current_user['username'],
-                    'time': datetime.now().strftime('%Y-%m-%d %H:%M'),
-                    'description': f"{current_user['username']} removed you from their friends"
-                })
-    
-    save_friends(friends_data)
-    
-    return jsonify({'success': True, 'message': 'Friend removed successfully'})
+    entries.sort(key=lambda entry: (entry['habit_streak'], entry['water_streak']), reverse=True)
+    return jsonify({'date': board['date'], 'leaderboard': entries})
 
 # Notes routes
 @app.route('/notes')
@@ -929,9 +1160,7 @@ def notes_page():
 @app.route('/notes/data', methods=['GET'])
 @login_required
 def get_notes():
-    notes = load_notes()
-    user_notes = [note for note in notes if note.get('user_id') == session['user_id']]
-    return jsonify(user_notes)
+    return jsonify(load_user_records('notes', session['user_id']))
 
 @app.route('/notes/add', methods=['POST'])
 @login_required
@@ -956,6 +1185,7 @@ def add_note():
     
     notes.append(new_note)
     save_notes(notes)
+    search_index.put('note', new_note)
     
     return jsonify(new_note), 201
 
@@ -978,6 +1208,7 @@ def update_note(note_id):
             
             note['updated_at'] = datetime.now().isoformat()
             save_notes(notes)
+            search_index.put('note', note)
             return jsonify(note)
     
     return jsonify({'error': 'Note not found or unauthorized'}), 404
@@ -991,9 +1222,72 @@ def delete_note(note_id):
         if note.get('id') == note_id and note.get('user_id') == session['user_id']:
             del notes[i]
             save_notes(notes)
+            search_index.discard('note', session['user_id'], note_id)
             return jsonify({'message': 'Note deleted successfully'})
     
     return jsonify({'error': 'Note not found or unauthorized'}), 404
 
+# Search routes
+@app.route('/search', methods=['GET'])
+@login_required
+def search_data():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing search query'}), 400
+    
+    kinds = request.args.getlist('type') or None
+    try:
+        limit = min(100, max(1, int(request.args.get('limit', 20))))
+    except ValueError:
+        limit = 20
+    
+    results = search_index.search(session['user_id'], query, kinds=kinds, limit=limit)
+    return jsonify({'query': query, 'results': results})
+
+# Export routes
+@app.route('/export', methods=['GET'])
+@login_required
+def export_data():
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in export.FORMATS:
+        return jsonify({'error': 'Unsupported export format'}), 400
+    
+    generate, mimetype, extension = export.FORMATS[fmt]
+    stores = {
+        'expenses': EXPENSES_FILE,
+        'habits': HABITS_FILE,
+        'notes': NOTES_FILE,
+        'water': WATER_FILE,
+    }
+    
+    # No Content-Length, so the response goes out with chunked transfer encoding
+    return Response(generate(session['user_id'], stores), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=life-manager-export.{extension}'
+    })
+
+# Live updates
+@app.route('/events', methods=['GET'])
+@login_required
+def event_stream():
+    headers = {
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    }
+    # A HEAD request gets the headers without holding a stream slot
+    if request.method == 'HEAD':
+        return Response(mimetype='text/event-stream', headers=headers)
+    
+    subscription = events.hub.subscribe(session['user_id'])
+    if subscription is None:
+        # EventSource gives up on an error response instead of reconnecting every few seconds
+        return Response('Too many live connections', status=503, mimetype='text/plain')
+    # The body runs after the request context is gone, so it only gets the subscription;
+    # closing it (even if it was never iterated) releases the slot
+    return Response(events.hub.stream(subscription), mimetype='text/event-stream', headers=headers)
+
 if __name__ == '__main__':
+    # With the debug reloader only the serving child process runs the scheduler
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        recurring_scheduler.start()
+        daily_rollover.start()
     app.run(debug=True)
@@ -0,0 +1,320 @@
+"""Hot/cold tiering for stores that grow forever.
+
+Records older than a horizon are moved out of the hot JSON stores into
+gzip-compressed cold segments, one per store and month:
+
+    archive/expenses/2024-03.json.gz
+    archive/water/2024-03.json.gz      (water history entries, with user_id)
+    archive/activities/2024-03.json.gz (friend activity entries, with user_id)
+
+archive/index.json lists, for each segment, how many records it holds and
+which users appear in it, so a read for one user or one date range only opens
+the segments it needs. It also keeps a change stamp per kind and user
+(index['stamps']), bumped whenever that user's archived records change, so
+caches can tell whether one user's archive moved without reading it. Decoded expense segments stay resident in each process
+as compact records (records.py) until the segment file is replaced, so
+repeated reads don't decompress and parse them again. Run it periodically:
+
+    python archive.py --horizon-days 365
+
+Each hot store is read, trimmed and written back while holding that store's
+file lock, the same lock the app takes around its own writes, and every
+change to the archive itself happens under the archive lock.
+"""
+import argparse
+import gzip
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import filelock
+import records
+
+ARCHIVE_DIR = 'archive'
+HORIZON_DAYS = int(os.environ.get('ARCHIVE_HORIZON_DAYS', 365))
+# Most archived expense records a process keeps decoded in memory
+RESIDENT_RECORDS = int(os.environ.get('ARCHIVE_RESIDENT_RECORDS', 50000))
+
+STORES = {
+    'expenses': 'expenses.json',
+    'water': 'water.json',
+    'friends': 'friends.json',
+}
+
+# Field holding the record date, per cold segment type
+DATE_FIELDS = {
+    'expenses': 'date',
+    'water': 'date',
+    'activities': 'time',
+}
+
+
+def _write_json(path, data, opener=open):
+    # Write to a temp file and rename, so readers never see a half-written file
+    tmp = f'{path}.tmp'
+    with opener(tmp, 'wt') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def _segment_path(kind, month, archive_dir):
+    return os.path.join(archive_dir, kind, f'{month}.json.gz')
+
+
+def locked(archive_dir=ARCHIVE_DIR):
+    """Exclusive lock on the archive, shared by every process that changes it"""
+    os.makedirs(archive_dir, exist_ok=True)
+    return filelock.locked(os.path.join(archive_dir, 'index.json'))
+
+
+def load_index(archive_dir=ARCHIVE_DIR):
+    return _read_json(os.path.join(archive_dir, 'index.json'), {})
+
+
+def _touch(index, kind, user_ids):
+    stamps = index.setdefault('stamps', {}).setdefault(kind, {})
+    for user_id in user_ids:
+        if user_id:
+            stamps[user_id] = stamps.get(user_id, 0) + 1
+
+
+# (archive dir, index file version, index) of the last index read by user_stamp()
+_stamped_index = [None, None, {}]
+
+
+def user_stamp(kind, user_id, archive_dir=ARCHIVE_DIR):
+    """Change stamp of the user's archived `kind` records (0 if they have none)"""
+    try:
+        st = os.stat(os.path.join(archive_dir, 'index.json'))
+    except OSError:
+        return 0
+    # The index is always replaced, never rewritten in place
+    version = (st.st_ino, st.st_size, st.st_mtime_ns)
+    if _stamped_index[:2] != [archive_dir, version]:
+        _stamped_index[:] = [archive_dir, version, load_index(archive_dir)]
+    return _stamped_index[2].get('stamps', {}).get(kind, {}).get(user_id, 0)
+
+
+def read_segment(kind, month, archive_dir=ARCHIVE_DIR):
+    path = _segment_path(kind, month, archive_dir)
+    if not os.path.exists(path):
+        return []
+    with gzip.open(path, 'rt') as f:
+        return json.load(f)
+
+
+# Segment path -> (file version, records), least recently used first; only
+# expense segments are kept, up to RESIDENT_RECORDS records in all
+_resident = OrderedDict()
+_resident_size = [0]
+_resident_lock = threading.Lock()
+
+
+def _evict(path):
+    _, dropped = _resident.pop(path)
+    _resident_size[0] -= len(dropped)
+
+
+def _resident_segment(kind, month, archive_dir):
+    """The segment's records, decoded once per version of the file"""
+    if kind != 'expenses':
+        return read_segment(kind, month, archive_dir)
+    path = _segment_path(kind, month, archive_dir)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return []
+    # Segments are always replaced, never rewritten in place
+    version = (st.st_ino, st.st_size, st.st_mtime_ns)
+    with _resident_lock:
+        cached = _resident.get(path)
+        if cached is not None and cached[0] == version:
+            _resident.move_to_end(path)
+            return cached[1]
+
+    decoded = records.from_dicts(records.Expense, read_segment(kind, month, archive_dir))
+    with _resident_lock:
+        if path in _resident:
+            _evict(path)
+        _resident[path] = (version, decoded)
+        _resident_size[0] += len(decoded)
+        # The segment just read stays, even if it alone is over the limit
+        while _resident_size[0] > RESIDENT_RECORDS and len(_resident) > 1:
+            _evict(next(iter(_resident)))
+    return decoded
+
+
+def _record_key(kind, record):
+    if kind == 'expenses' and record.get('id'):
+        return record['id']
+    return json.dumps(record, sort_keys=True)
+
+
+def _append(index, kind, cold, archive_dir):
+    """Merge cold records into their month segments; safe to re-run after a crash"""
+    by_month = {}
+    for record in cold:
+        by_month.setdefault(str(record.get(DATE_FIELDS[kind], ''))[:7], []).append(record)
+
+    os.makedirs(os.path.join(archive_dir, kind), exist_ok=True)
+    segments = index.setdefault(kind, {})
+    for month, moved in by_month.items():
+        existing = read_segment(kind, month, archive_dir)
+        seen = {_record_key(kind, record) for record in existing}
+        existing.extend(record for record in moved if _record_key(kind, record) not in seen)
+        existing.sort(key=lambda record: str(record.get(DATE_FIELDS[kind], '')))
+        _touch(index, kind, {record.get('user_id') for record in moved})
+        _write_json(_segment_path(kind, month, archive_dir), existing, gzip.open)
+        segments[month] = {
+            'count': len(existing),
+            'users': sorted({record.get('user_id') for record in existing if record.get('user_id')}),
+        }
+
+
+def _is_old(value, cutoff):
+    # Only well-formed dates are archived; anything else stays hot
+    return isinstance(value, str) and len(value) >= 10 and value[4] == '-' and value[:10] < cutoff
+
+
+def archive(horizon_days=HORIZON_DAYS, today=None, stores=STORES, archive_dir=ARCHIVE_DIR):
+    """Move records older than `horizon_days` into cold segments; returns counts per kind"""
+    today = today or date.today()
+    cutoff = (today - timedelta(days=horizon_days)).isoformat()
+    moved = {}
+
+    with locked(archive_dir):
+        index = load_index(archive_dir)
+
+        # Cold segments are written before the hot stores are trimmed, so a crash
+        # in between only leaves duplicates that the next run skips
+        with filelock.locked(stores['expenses']):
+            expenses = _read_json(stores['expenses'], [])
+            cold = [e for e in expenses if _is_old(e.get('date'), cutoff)]
+            if cold:
+                _append(index, 'expenses', cold, archive_dir)
+                _write_json(stores['expenses'], [e for e in expenses if not _is_old(e.get('date'), cutoff)])
+            moved['expenses'] = len(cold)
+
+        with filelock.locked(stores['water']):
+            water = _read_json(stores['water'], {})
+            cold = []
+            for user_id, data in water.items():
+                history = data.get('history', [])
+                old = [entry for entry in history if _is_old(entry.get('date'), cutoff)]
+                if old:
+                    cold.extend(dict(entry, user_id=user_id) for entry in old)
+                    data['history'] = [entry for entry in history if not _is_old(entry.get('date'), cutoff)]
+            if cold:
+                _append(index, 'water', cold, archive_dir)
+                _write_json(stores['water'], water)
+            moved['water'] = len(cold)
+
+        with filelock.locked(stores['friends']):
+            friends = _read_json(stores['friends'], {})
+            cold = []
+            for user_id, data in friends.items():
+                activities = data.get('activities', [])
+                old = [entry for entry in activities if _is_old(entry.get('time'), cutoff)]
+                if old:
+                    cold.extend(dict(entry, user_id=user_id) for entry in old)
+                    data['activities'] = [entry for entry in activities if not _is_old(entry.get('time'), cutoff)]
+            if cold:
+                _append(index, 'activities', cold, archive_dir)
+                _write_json(stores['friends'], friends)
+            moved['activities'] = len(cold)
+
+        _write_json(os.path.join(archive_dir, 'index.json'), index)
+    return moved
+
+
+def _pop_archived(index, kind, user_id, record_id, archive_dir):
+    """Remove a user's archived record from its segment; returns it, or None if not archived"""
+    for month, meta in sorted(index.get(kind, {}).items()):
+        if user_id not in meta.get('users', ()):
+            continue
+        records = read_segment(kind, month, archive_dir)
+        for i, record in enumerate(records):
+            if record.get('id') == record_id and record.get('user_id') == user_id:
+                del records[i]
+                _touch(index, kind, (user_id,))
+                if records:
+                    _write_json(_segment_path(kind, month, archive_dir), records, gzip.open)
+                    meta['count'] = len(records)
+                    meta['users'] = sorted({r.get('user_id') for r in records if r.get('user_id')})
+                else:
+                    os.remove(_segment_path(kind, month, archive_dir))
+                    del index[kind][month]
+                return record
+    return None
+
+
+def update_archived(kind, user_id, record_id, changes, archive_dir=ARCHIVE_DIR):
+    """Apply `changes` to an archived record (moving it if its month changes); returns it or None"""
+    with locked(archive_dir):
+        index = load_index(archive_dir)
+        record = _pop_archived(index, kind, user_id, record_id, archive_dir)
+        if record is None:
+            return None
+        record.update(changes)
+        _append(index, kind, [record], archive_dir)
+        _write_json(os.path.join(archive_dir, 'index.json'), index)
+        return record
+
+
+def delete_archived(kind, user_id, record_id, archive_dir=ARCHIVE_DIR):
+    """Delete an archived record; returns False if the user has no such record"""
+    with locked(archive_dir):
+        index = load_index(archive_dir)
+        if _pop_archived(index, kind, user_id, record_id, archive_dir) is None:
+            return False
+        _write_json(os.path.join(archive_dir, 'index.json'), index)
+        return True
+
+
+def iter_archived(kind, user_id=None, start=None, end=None, archive_dir=ARCHIVE_DIR):
+    """Archived records of `kind`, oldest first, optionally for one user and a date range
+
+    `start` and `end` are inclusive 'YYYY-MM-DD' strings. Only segments whose
+    month overlaps the range and whose index entry lists the user are opened.
+    """
+    field = DATE_FIELDS[kind]
+    for month, meta in sorted(load_index(archive_dir).get(kind, {}).items()):
+        if start and month < start[:7]:
+            continue
+        if end and month > end[:7]:
+            break
+        if user_id is not None and user_id not in meta.get('users', ()):
+            continue
+        for record in _resident_segment(kind, month, archive_dir):
+            if user_id is not None and record.get('user_id') != user_id:
+                continue
+            day = record.get(field, '')[:10]
+            if (start and day < start) or (end and day > end):
+                continue
+            # Callers get a fresh dict they are free to change
+            yield record.to_dict() if isinstance(record, records.Record) else record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Move old records into compressed monthly archives')
+    parser.add_argument('--horizon-days', type=int, default=HORIZON_DAYS,
+                        help=f'keep this many days in the hot stores (default: {HORIZON_DAYS})')
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    args = parser.parse_args(argv)
+
+    moved = archive(args.horizon_days, archive_dir=args.archive_dir)
+    for kind, count in moved.items():
+        print(f'{kind}: archived {count} records')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""Fingerprinted static bundles and a Jinja bytecode cache.
+
+Shared CSS and JS are concatenated into bundles whose file names carry a hash
+of their content (static/dist/app.3f9c2a1b7e.js), so they can be served with
+a far-future, immutable Cache-Control header: a changed bundle gets a new
+name, and pages pick it up through `asset_url()` in the templates.
+
+    python assets.py build
+
+writes the bundles and static/dist/manifest.json, pre-compresses the bundles
+(see compression.py) and compiles every template into the bytecode cache, so
+a freshly started worker loads compiled templates instead of parsing them.
+When the manifest is missing or older than a source file, init_app() builds
+the bundles itself.
+"""
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+from flask import request, url_for
+from jinja2 import FileSystemBytecodeCache
+
+import compression
+import filelock
+
+# Bundle name -> source files (relative to the static folder), concatenated in order
+BUNDLES = {
+    'app.css': ('style.css',),
+    'auth.css': ('auth.css',),
+    'app.js': ('js/theme.js',),
+}
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+BYTECODE_CACHE_DIR = 'jinja_cache'
+MAX_AGE = 365 * 24 * 60 * 60
+
+
+def _fingerprinted(name, digest):
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{digest}{ext}'
+
+
+def _write(path, data):
+    # A private temp name per writer, so builds never trip over each other's files
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.tmp')
+    try:
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def build(static_dir, bundles=BUNDLES):
+    """Write every bundle under static_dir/dist and return the new manifest"""
+    dist_dir = os.path.join(static_dir, DIST_DIR)
+    os.makedirs(dist_dir, exist_ok=True)
+    manifest_path = os.path.join(dist_dir, MANIFEST)
+
+    # Workers booting together would otherwise delete each other's fresh bundles
+    with filelock.locked(manifest_path):
+        return _build(static_dir, dist_dir, manifest_path, bundles)
+
+
+def _build(static_dir, dist_dir, manifest_path, bundles):
+    manifest = {}
+    for name, sources in bundles.items():
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_dir, source), 'rb') as f:
+                parts.append(f.read().rstrip(b'\n') + b'\n')
+        data = b'\n'.join(parts)
+        filename = _fingerprinted(name, hashlib.sha256(data).hexdigest()[:10])
+        path = os.path.join(dist_dir, filename)
+        if not os.path.exists(path):
+            _write(path, data)
+        manifest[name] = f'{DIST_DIR}/{filename}'
+
+    # Bundles from older builds are dropped; pages cached with their URLs just re-fetch
+    current = {os.path.basename(path) for path in manifest.values()}
+    for filename in os.listdir(dist_dir):
+        # Temp files and the build lock (dot files) belong to whoever is writing them
+        if filename.startswith('.') or filename == MANIFEST + '.lock':
+            continue
+        base, ext = os.path.splitext(filename)
+        if ext not in compression.SUFFIXES.values():
+            base = filename
+        if base not in current and filename != MANIFEST:
+            try:
+                os.remove(os.path.join(dist_dir, filename))
+            except FileNotFoundError:
+                pass
+
+    _write(manifest_path, json.dumps(manifest, indent=2).encode('utf-8'))
+    return manifest
+
+
+def _stale(static_dir, bundles):
+    try:
+        built = os.stat(os.path.join(static_dir, DIST_DIR, MANIFEST)).st_mtime_ns
+        return any(os.stat(os.path.join(static_dir, source)).st_mtime_ns > built
+                   for sources in bundles.values() for source in sources)
+    except OSError:
+        return True
+
+
+def load_manifest(static_dir, bundles=BUNDLES):
+    if _stale(static_dir, bundles):
+        return build(static_dir, bundles)
+    with open(os.path.join(static_dir, DIST_DIR, MANIFEST), 'r') as f:
+        return json.load(f)
+
+
+def precompile_templates(app):
+    """Compile every template into the bytecode cache; returns how many were compiled"""
+    names = [name for name in app.jinja_env.list_templates() if name.endswith('.html')]
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def init_app(app, bundles=BUNDLES):
+    app.config.setdefault('ASSETS_BUNDLES', bundles)
+    app.config.setdefault('BYTECODE_CACHE_DIR', BYTECODE_CACHE_DIR)
+
+    os.makedirs(app.config['BYTECODE_CACHE_DIR'], exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['BYTECODE_CACHE_DIR'])
+
+    state = {'manifest': load_manifest(app.static_folder, app.config['ASSETS_BUNDLES'])}
+
+    def asset_url(name):
+        # The debug server picks up edited sources without a manual rebuild
+        if app.debug and _stale(app.static_folder, app.config['ASSETS_BUNDLES']):
+            state['manifest'] = build(app.static_folder, app.config['ASSETS_BUNDLES'])
+        return url_for('static', filename=state['manifest'][name])
+
+    app.jinja_env.globals['asset_url'] = asset_url
+
+    @app.after_request
+    def cache_bundles(response):
+        filename = request.view_args.get('filename', '') if request.view_args else ''
+        if request.endpoint == 'static' and filename.startswith(DIST_DIR + '/') and response.status_code in (200, 304):
+            # The name changes whenever the content does, so the file itself never has to be revalidated
+            response.cache_control.public = True
+            response.cache_control.max_age = MAX_AGE
+            response.cache_control.immutable = True
+            response.cache_control.no_cache = None
+        return response
+
+    return app
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] != 'build':
+        print(__doc__)
+        return
+
+    from app import app
+
+    manifest = build(app.static_folder, app.config['ASSETS_BUNDLES'])
+    for name, path in manifest.items():
+        print(f'{name} -> {path}')
+    for path, original, compressed in compression.precompress(os.path.join(app.static_folder, DIST_DIR)):
+        print(f'{path}: {original} -> {compressed} bytes')
+    print(f'compiled {precompile_templates(app)} templates into {app.config["BYTECODE_CACHE_DIR"]}/')
+
+
+if __name__ == '__main__':
+    main()
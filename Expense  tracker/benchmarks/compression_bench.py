@@ -0,0 +1,101 @@
+"""Bytes on the wire and CPU cost of response compression, per route.
+
+Runs the app against a throwaway copy of the data stores with a synthetic
+user (so the JSON routes return realistic payloads) and requests each route
+with no compression, gzip and (if installed) Brotli.
+
+    python benchmarks/compression_bench.py [expenses_per_user]
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+ROUTES = (
+    '/',
+    '/expenses',
+    '/habits',
+    '/water',
+    '/notes',
+    '/expenses/data',
+    '/habits/data',
+    '/notes/data',
+    '/static/style.css',
+)
+REPEAT = 20
+
+
+def seed(workdir, user_id, count):
+    today = date.today()
+    expenses = [{
+        'id': str(uuid.uuid4()),
+        'user_id': user_id,
+        'description': f'Purchase {i}',
+        'amount': float(i % 250) + 0.99,
+        'category': ('food', 'transport', 'entertainment', 'bills')[i % 4],
+        'date': (today - timedelta(days=i % 365)).isoformat(),
+        'type': 'expense',
+    } for i in range(count)]
+    habits = [{
+        'id': str(uuid.uuid4()), 'user_id': user_id, 'name': f'Habit {i}', 'category': 'health',
+        'frequency': 'daily', 'created_at': today.isoformat(), 'streak': i,
+        'completedDates': [(today - timedelta(days=d)).isoformat() for d in range(30)],
+    } for i in range(20)]
+    notes = [{
+        'id': str(uuid.uuid4()), 'user_id': user_id, 'content': 'Remember to ' * 20, 'title': f'Note {i}',
+        'color': '#f9ca24', 'position': {'x': 0, 'y': 0},
+        'created_at': today.isoformat(), 'updated_at': today.isoformat(),
+    } for i in range(50)]
+    for name, data in (('expenses.json', expenses), ('habits.json', habits), ('notes.json', notes),
+                       ('users.json', []), ('water.json', {}), ('friends.json', {})):
+        with open(os.path.join(workdir, name), 'w') as f:
+            json.dump(data, f)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    user_id = str(uuid.uuid4())
+    seed(workdir, user_id, count)
+
+    import compression
+    from app import app
+
+    # Pre-compressed copies live in a scratch static folder so the repo stays clean
+    static_dir = os.path.join(workdir, 'static')
+    shutil.copytree(app.static_folder, static_dir)
+    compression.precompress(static_dir)
+    app.static_folder = static_dir
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['username'] = 'bench'
+
+    encodings = ('identity',) + compression.available_encodings()
+    print(f"{'route':<22}" + ''.join(f'{e + " bytes":>16}{e + " cpu ms":>16}' for e in encodings))
+    for route in ROUTES:
+        row = f'{route:<22}'
+        for encoding in encodings:
+            start = time.process_time()
+            for _ in range(REPEAT):
+                response = client.get(route, headers={'Accept-Encoding': encoding})
+                size = len(response.get_data())
+                response.close()
+            cpu = (time.process_time() - start) / REPEAT * 1000
+            row += f'{size:>16}{cpu:>16.2f}'
+        print(row)
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Page weight and template load time.
+
+Renders every page for a synthetic user against a throwaway copy of the data
+stores and adds up what a browser downloads: the HTML plus the local CSS/JS
+it references (gzipped, as they go over the wire). The session column walks
+through all pages in order with a browser cache, where assets served with a
+max-age are downloaded once and everything else is fetched again.
+
+Also times loading every template in a fresh Jinja environment, as a new
+worker does, with and without a warm bytecode cache.
+
+    python benchmarks/page_weight_bench.py
+"""
+import gzip
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+from jinja2 import FileSystemBytecodeCache
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+PAGES = (
+    '/login',
+    '/signup',
+    '/',
+    '/expenses',
+    '/habits',
+    '/water',
+    '/notes',
+    '/community',
+    '/profile',
+)
+ASSET_RE = re.compile(r'(?:href|src)="(/static/[^"]+)"')
+REPEAT = 20
+
+
+def wire_size(data):
+    return len(gzip.compress(data, compresslevel=6, mtime=0))
+
+
+def cacheable(response):
+    return 'max-age' in response.headers.get('Cache-Control', '') and 'no-cache' not in response.headers.get('Cache-Control', '')
+
+
+def template_load_ms(app, bytecode_cache):
+    names = [name for name in app.jinja_env.list_templates() if name.endswith('.html')]
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        env = app.jinja_env.overlay(cache_size=0, bytecode_cache=bytecode_cache)
+        for name in names:
+            env.get_template(name)
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+def main():
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    user_id = str(uuid.uuid4())
+    for name, data in (('users.json', [{'id': user_id, 'username': 'bench', 'email': 'bench@example.com', 'password': '',
+                                      'created_at': '2024-01-01T00:00:00'}]),
+                       ('expenses.json', []), ('habits.json', []), ('notes.json', []),
+                       ('water.json', {}), ('friends.json', {})):
+        with open(os.path.join(workdir, name), 'w') as f:
+            json.dump(data, f)
+
+    from app import app
+
+    client = app.test_client()
+    cached = set()
+    total_html = total_assets = session_bytes = 0
+    print(f"{'page':<12}{'html':>10}{'assets':>10}{'first visit':>14}{'in session':>14}")
+    for page in PAGES:
+        with client.session_transaction() as session:
+            if page in ('/login', '/signup'):
+                session.clear()
+            else:
+                session['user_id'] = user_id
+                session['username'] = 'bench'
+
+        response = client.get(page)
+        html = response.get_data()
+        html_size = wire_size(html)
+
+        assets_size = in_session = 0
+        for url in dict.fromkeys(ASSET_RE.findall(html.decode('utf-8'))):
+            asset = client.get(url)
+            size = wire_size(asset.get_data())
+            asset.close()
+            assets_size += size
+            if url not in cached:
+                in_session += size
+            if cacheable(asset):
+                cached.add(url)
+
+        total_html += html_size
+        total_assets += assets_size
+        session_bytes += html_size + in_session
+        print(f'{page:<12}{html_size:>10}{assets_size:>10}{html_size + assets_size:>14}{html_size + in_session:>14}')
+
+    print(f"{'total':<12}{total_html:>10}{total_assets:>10}{total_html + total_assets:>14}{session_bytes:>14}")
+
+    cache_dir = os.path.join(workdir, 'bench_jinja_cache')
+    os.makedirs(cache_dir)
+    bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    template_load_ms(app, bytecode_cache)
+    print()
+    print(f'template load, no bytecode cache:   {template_load_ms(app, None):8.2f} ms')
+    print(f'template load, warm bytecode cache: {template_load_ms(app, bytecode_cache):8.2f} ms')
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
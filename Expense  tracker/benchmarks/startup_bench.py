@@ -0,0 +1,48 @@
+"""Measure cold-boot time and import footprint of app.py.
+
+"eager" imports the app and then builds every integration, which is what the
+old module-level Twilio setup did on every boot. "lazy" only imports the app.
+
+    python benchmarks/startup_bench.py [runs]
+"""
+import os
+import subprocess
+import sys
+import statistics
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = '''
+import sys, time
+start = time.perf_counter()
+import app
+if sys.argv[1] == 'eager':
+    import integrations
+    integrations.warm_up()
+elapsed = time.perf_counter() - start
+print(elapsed, len(sys.modules), sum(1 for m in sys.modules if m.startswith(('twilio', 'dotenv'))))
+'''
+
+
+def run(mode):
+    env = dict(os.environ)
+    # Dummy credentials so the Twilio client is actually constructed in eager mode
+    env.setdefault('TWILIO_ACCOUNT_SID', 'AC' + '0' * 32)
+    env.setdefault('TWILIO_AUTH_TOKEN', '0' * 32)
+    out = subprocess.run([sys.executable, '-c', PROBE, mode], cwd=APP_DIR, env=env,
+                         capture_output=True, text=True, check=True).stdout.split()
+    return float(out[0]), int(out[1]), int(out[2])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'mode':<8}{'median ms':>12}{'min ms':>10}{'modules':>10}{'twilio/dotenv':>15}")
+    for mode in ('eager', 'lazy'):
+        results = [run(mode) for _ in range(runs)]
+        times = [r[0] * 1000 for r in results]
+        print(f"{mode:<8}{statistics.median(times):>12.1f}{min(times):>10.1f}"
+              f"{results[-1][1]:>10}{results[-1][2]:>15}")
+
+
+if __name__ == '__main__':
+    main()
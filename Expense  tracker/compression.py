@@ -0,0 +1,155 @@
+"""Response compression for HTML, JSON and static assets.
+
+init_app() installs an after_request hook that compresses eligible responses
+with Brotli (when the `brotli` package is installed and the client accepts
+it) or gzip. Static files are served from pre-compressed `.br`/`.gz` copies
+when those exist and are up to date, so they cost no CPU per request:
+
+    python compression.py precompress [static_dir]
+
+Settings (app.config):
+    COMPRESS_MIMETYPES   content types that are compressed
+    COMPRESS_MIN_SIZE    smaller bodies are sent as-is (bytes)
+    COMPRESS_GZIP_LEVEL  1-9
+    COMPRESS_BR_LEVEL    0-11
+"""
+import gzip
+import os
+import sys
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULTS = {
+    'COMPRESS_MIMETYPES': (
+        'text/html',
+        'text/css',
+        'text/plain',
+        'application/json',
+        'application/javascript',
+        'text/javascript',
+        'image/svg+xml',
+    ),
+    'COMPRESS_MIN_SIZE': 500,
+    'COMPRESS_GZIP_LEVEL': 6,
+    'COMPRESS_BR_LEVEL': 5,
+}
+
+# File suffix used for each pre-compressed encoding
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(data, encoding, config=DEFAULTS):
+    if encoding == 'br':
+        return brotli.compress(data, quality=config['COMPRESS_BR_LEVEL'])
+    return gzip.compress(data, compresslevel=config['COMPRESS_GZIP_LEVEL'], mtime=0)
+
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    for encoding in available_encodings():
+        if accepted[encoding]:
+            return encoding
+    return None
+
+
+def _precompressed(response, encoding, static_folder):
+    """Body of the matching .br/.gz file for a static response, if it is current"""
+    filename = request.view_args.get('filename') if request.view_args else None
+    if not filename:
+        return None
+    source = os.path.join(static_folder, filename)
+    compressed = source + SUFFIXES[encoding]
+    try:
+        if os.stat(compressed).st_mtime < os.stat(source).st_mtime:
+            return None
+        with open(compressed, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def init_app(app):
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+
+    @app.after_request
+    def compress_response(response):
+        config = app.config
+        # Streamed responses (e.g. /export) are already chunked and often already zipped
+        if (response.status_code != 200
+                or response.is_streamed and request.endpoint != 'static'
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in config['COMPRESS_MIMETYPES']):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = _choose_encoding()
+        if encoding is None:
+            return response
+
+        if request.endpoint == 'static':
+            body = _precompressed(response, encoding, app.static_folder)
+            if body is None:
+                return response
+            response.direct_passthrough = False
+        else:
+            data = response.get_data()
+            if len(data) < config['COMPRESS_MIN_SIZE']:
+                return response
+            body = compress(data, encoding, config)
+
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        if response.headers.get('ETag'):
+            # Keep caches from mixing up the encoded and identity variants
+            etag, weak = response.get_etag()
+            response.set_etag(f'{etag}-{encoding}', weak)
+        return response
+
+    return app
+
+
+def precompress(static_dir, config=DEFAULTS):
+    """Write .br/.gz copies of every compressible file under `static_dir`"""
+    extensions = ('.css', '.js', '.html', '.svg', '.json', '.txt')
+    written = []
+    for root, _, files in os.walk(static_dir):
+        for name in files:
+            if not name.endswith(extensions):
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            if len(data) < config['COMPRESS_MIN_SIZE']:
+                continue
+            for encoding in available_encodings():
+                body = compress(data, encoding, config)
+                if len(body) >= len(data):
+                    continue
+                with open(path + SUFFIXES[encoding], 'wb') as f:
+                    f.write(body)
+                written.append((path + SUFFIXES[encoding], len(data), len(body)))
+    return written
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] != 'precompress':
+        print(__doc__)
+        return
+    static_dir = argv[1] if len(argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    for path, original, compressed in precompress(static_dir):
+        print(f'{path}: {original} -> {compressed} bytes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""In-process pub/sub for the /events server-sent events stream.
+
+Routes publish two kinds of events to the users they concern:
+
+    activity   a new entry in the user's friend activity feed
+    change     one of the user's stores changed, e.g. {"store": "water"}
+
+Each open /events connection is a Subscription with its own bounded buffer.
+A client that stops reading cannot make the hub grow: once its buffer is full
+the oldest events are dropped and the client is sent a `resync` event telling
+it to re-fetch instead of trusting the stream.
+
+Every open stream holds a worker thread until the client goes away, so the
+hub caps how many it serves at once: per user (MAX_CONNECTIONS_PER_USER) and
+per process (`max_streams`, set from the gunicorn thread count). A connection
+over either limit is refused with a 503 rather than evicting another one;
+EventSource does not retry a failed response, so the extra tab simply runs
+without live updates instead of reconnecting in a loop.
+
+The hub lives in the worker process, so an event only reaches connections
+served by the worker that published it; gunicorn.conf.py runs a single
+threaded worker by default for that reason.
+"""
+import itertools
+import json
+import threading
+from collections import deque
+
+BUFFER_SIZE = 100
+MAX_CONNECTIONS_PER_USER = 5
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 5000
+
+
+class Subscription:
+    def __init__(self, user_id, buffer_size=BUFFER_SIZE):
+        self.user_id = user_id
+        self.buffer = deque(maxlen=buffer_size)
+        self.dropped = 0
+        self.closed = False
+        self.ready = threading.Condition()
+
+    def push(self, event):
+        with self.ready:
+            if len(self.buffer) == self.buffer.maxlen:
+                self.dropped += 1
+            self.buffer.append(event)
+            self.ready.notify()
+
+    def close(self):
+        with self.ready:
+            self.closed = True
+            self.ready.notify()
+
+    def next(self, timeout):
+        """The next event, ('resync', n) after dropped events, or None on timeout/close"""
+        with self.ready:
+            self.ready.wait_for(lambda: self.buffer or self.dropped or self.closed, timeout)
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                return {'event': 'resync', 'data': {'dropped': dropped}}
+            if self.buffer and not self.closed:
+                return self.buffer.popleft()
+            return None
+
+
+class EventHub:
+    def __init__(self, buffer_size=BUFFER_SIZE, max_connections=MAX_CONNECTIONS_PER_USER, max_streams=None):
+        self.buffer_size = buffer_size
+        self.max_connections = max_connections
+        # None means no process-wide cap, e.g. under the dev server's thread per request
+        self.max_streams = max_streams
+        self.streams = 0
+        self.subscribers = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """A new Subscription, or None if the user or the process is at its stream limit"""
+        subscription = Subscription(user_id, self.buffer_size)
+        with self.lock:
+            subs = self.subscribers.get(user_id, [])
+            if len(subs) >= self.max_connections:
+                return None
+            if self.max_streams is not None and self.streams >= self.max_streams:
+                return None
+            self.subscribers[user_id] = subs + [subscription]
+            self.streams += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subs = self.subscribers.get(subscription.user_id, [])
+            if subscription in subs:
+                subs.remove(subscription)
+                self.streams -= 1
+            if not subs:
+                self.subscribers.pop(subscription.user_id, None)
+        subscription.close()
+
+    def publish(self, user_ids, event, data):
+        """Send `event` to every open connection of each user in `user_ids`"""
+        if isinstance(user_ids, str):
+            user_ids = (user_ids,)
+        message = {'id': next(self.ids), 'event': event, 'data': data}
+        with self.lock:
+            targets = [sub for user_id in user_ids for sub in self.subscribers.get(user_id, ())]
+        for subscription in targets:
+            subscription.push(message)
+        return len(targets)
+
+    def stream(self, subscription, heartbeat=HEARTBEAT_SECONDS):
+        """Response body for one connection; unsubscribes when the server closes it"""
+        return Stream(self, subscription, heartbeat)
+
+
+class Stream:
+    """Iterable of SSE lines whose close() releases the subscription
+
+    The server calls close() on every response body, including one it never
+    iterated (a HEAD request, or a client gone before the first byte), which
+    a generator's `finally` would not cover.
+    """
+
+    def __init__(self, hub, subscription, heartbeat):
+        self.hub = hub
+        self.subscription = subscription
+        self.lines = self._lines(heartbeat)
+
+    def _lines(self, heartbeat):
+        subscription = self.subscription
+        yield f'retry: {RETRY_MS}\n\n'
+        while not subscription.closed:
+            message = subscription.next(heartbeat)
+            if message is None:
+                # Comment line keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+                continue
+            yield format_event(message)
+
+    def __iter__(self):
+        return self.lines
+
+    def close(self):
+        self.lines.close()
+        self.hub.unsubscribe(self.subscription)
+
+
+def format_event(message):
+    lines = []
+    if 'id' in message:
+        lines.append(f"id: {message['id']}")
+    lines.append(f"event: {message['event']}")
+    lines.append(f"data: {json.dumps(message['data'], separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+hub = EventHub()
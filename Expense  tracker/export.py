@@ -0,0 +1,239 @@
+"""Streaming data export.
+
+Everything here is a generator: the JSON stores are read incrementally, one
+record at a time, and output is produced in small chunks, so exporting a user
+(or every user, for backups) runs in constant memory regardless of how much
+history there is. The /export route streams these chunks straight to the
+client; the same pipeline is available from the command line:
+
+    python export.py --user <user_id> --format zip --out export.zip
+    python export.py --all --format ndjson --out backup.ndjson
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import zipfile
+
+import archive
+
+CHUNK_SIZE = 64 * 1024
+
+# Store files, relative to the working directory like in app.py
+STORES = {
+    'expenses': 'expenses.json',
+    'habits': 'habits.json',
+    'notes': 'notes.json',
+    'water': 'water.json',
+}
+
+# CSV columns per store; list values are joined with ';'
+COLUMNS = {
+    'expenses': ('id', 'date', 'description', 'category', 'amount', 'type'),
+    'habits': ('id', 'name', 'category', 'frequency', 'created_at', 'streak', 'completedDates'),
+    'notes': ('id', 'title', 'content', 'color', 'created_at', 'updated_at'),
+    'water': ('date', 'amount'),
+}
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+# Characters that can continue a number ('-1' may be the start of '-1.5e+3')
+_NUMBER_TAIL = '0123456789.eE+-'
+
+
+class _Reader:
+    """Incremental reader over a JSON file that only buffers the value being decoded"""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character (without consuming it), or '' at end of file"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos} in {self.f.name}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                # A number cut off by the end of the buffer decodes as a shorter
+                # number, so only trust a decode followed by something that can't
+                # continue it (valid JSON never has those characters after a value)
+                if self.eof or (end < len(self.buf) and self.buf[end] not in _NUMBER_TAIL):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def items(self, container):
+        """Yield elements of a top-level array, or (key, value) pairs of a top-level object"""
+        closing = ']' if container == '[' else '}'
+        self.expect(container)
+        first = True
+        while True:
+            if self.peek() == closing:
+                self.pos += 1
+                return
+            if not first:
+                self.expect(',')
+            first = False
+            if container == '[':
+                yield self.value()
+            else:
+                key = self.value()
+                self.expect(':')
+                yield key, self.value()
+
+
+def iter_array(path):
+    """Records of a JSON array store, one at a time"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r') as f:
+        yield from _Reader(f).items('[')
+
+
+def iter_object(path):
+    """(key, value) pairs of a JSON object store, one at a time"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r') as f:
+        yield from _Reader(f).items('{')
+
+
+def iter_records(store, user_id=None, stores=STORES):
+    """Records of `store` for one user (or all users when user_id is None), archived ones first"""
+    path = stores[store]
+    if store in archive.DATE_FIELDS:
+        yield from archive.iter_archived(store, user_id)
+
+    if store == 'water':
+        # water.json is keyed by user; each day of history becomes one record
+        for owner, data in iter_object(path):
+            if user_id is not None and owner != user_id:
+                continue
+            for entry in data.get('history', []):
+                yield dict(entry, user_id=owner)
+        return
+
+    for record in iter_array(path):
+        if user_id is None or record.get('user_id') == user_id:
+            yield record
+
+
+def ndjson_chunks(user_id=None, stores=STORES):
+    """NDJSON lines {"store": ..., "data": {...}} batched into ~CHUNK_SIZE byte chunks"""
+    buf = []
+    size = 0
+    for store in stores:
+        for record in iter_records(store, user_id, stores):
+            line = json.dumps({'store': store, 'data': record}) + '\n'
+            buf.append(line)
+            size += len(line)
+            if size >= CHUNK_SIZE:
+                yield ''.join(buf).encode('utf-8')
+                buf = []
+                size = 0
+    if buf:
+        yield ''.join(buf).encode('utf-8')
+
+
+class _Pipe(io.RawIOBase):
+    """Write-only, unseekable sink that hands written bytes back to the generator"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return ';'.join(str(item) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return value
+
+
+def zip_chunks(user_id=None, stores=STORES):
+    """A zip archive with one CSV per store, produced as it is written"""
+    pipe = _Pipe()
+    with zipfile.ZipFile(pipe, 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+        for store in stores:
+            columns = COLUMNS[store] if user_id is not None else ('user_id',) + COLUMNS[store]
+            with bundle.open(f'{store}.csv', 'w', force_zip64=True) as member:
+                text = io.TextIOWrapper(member, encoding='utf-8', newline='', write_through=True)
+                writer = csv.writer(text)
+                writer.writerow(columns)
+                for record in iter_records(store, user_id, stores):
+                    writer.writerow([_csv_value(record.get(column)) for column in columns])
+                    if sum(len(chunk) for chunk in pipe.chunks) >= CHUNK_SIZE:
+                        yield pipe.drain()
+                text.flush()
+                text.detach()
+            yield pipe.drain()
+    yield pipe.drain()
+
+
+FORMATS = {
+    'ndjson': (ndjson_chunks, 'application/x-ndjson', 'ndjson'),
+    'zip': (zip_chunks, 'application/zip', 'zip'),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stream user data as NDJSON or a zip of CSVs')
+    who = parser.add_mutually_exclusive_group(required=True)
+    who.add_argument('--user', help='export a single user id')
+    who.add_argument('--all', action='store_true', help='export every user (backup mode)')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='ndjson')
+    parser.add_argument('--out', help='output file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    chunks = FORMATS[args.format][0](None if args.all else args.user)
+    out = open(args.out, 'wb') if args.out else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.out:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: the development server runs a single process anyway
+    fcntl = None
+
+
+@contextmanager
+def locked(path):
+    """Exclusive advisory lock on `path`.lock, shared by every worker process"""
+    if fcntl is None:
+        yield
+        return
+    with open(f'{path}.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,121 @@
+import os
+import threading
+from collections import Counter
+
+# Set-based friend graph over friends.json.
+# friends.json keeps its lists (in the order friends were added); this index
+# holds the same edges as adjacency sets, so membership checks are O(1) and
+# mutual-friend counts are set intersections. Edges are kept as stored: a
+# user's set is exactly their own 'friends' list, so a friendship recorded on
+# only one side still reads as one-sided.
+#
+# The graph is cached per process. friends.json is rewritten for every
+# activity entry, so its mtime says nothing about the edges; instead every
+# change to the edges bumps a counter in a small side file (friends.json.edges)
+# and the graph is only rebuilt when that counter moves.
+#
+# Each user's set is a frozenset that is replaced, never changed in place, so
+# readers can walk the graph without the lock while a route links or unlinks.
+
+
+class FriendGraph:
+    def __init__(self, adjacency=None):
+        self.adjacency = adjacency or {}
+
+    @classmethod
+    def from_store(cls, friends_data):
+        return cls({user_id: frozenset(data.get('friends', []))
+                    for user_id, data in friends_data.items()})
+
+    def friends(self, user_id):
+        return self.adjacency.get(user_id, frozenset())
+
+    def are_friends(self, user_id, other_id):
+        return other_id in self.friends(user_id)
+
+    def add(self, user_id, other_id):
+        self.adjacency[user_id] = self.friends(user_id) | {other_id}
+
+    def remove(self, user_id, other_id):
+        self.adjacency[user_id] = self.friends(user_id) - {other_id}
+
+    def mutual(self, user_id, other_id):
+        return self.friends(user_id) & self.friends(other_id)
+
+    def mutual_counts(self, user_id, others):
+        """Mutual friend count between `user_id` and each of `others`"""
+        mine = self.friends(user_id)
+        # Set intersection walks the smaller of the two sets
+        return {other_id: len(mine & self.friends(other_id)) for other_id in others}
+
+    def suggestions(self, user_id, limit=10):
+        """Friends of friends ranked by how many mutual friends they have with `user_id`"""
+        mine = self.friends(user_id)
+        counts = Counter()
+        # One pass over each friend's adjacency set counts every candidate's mutual friends at once
+        for friend_id in mine:
+            counts.update(self.friends(friend_id) - mine)
+        counts.pop(user_id, None)
+        return counts.most_common(limit)
+
+
+class FriendGraphIndex:
+    """Per-process cache of the FriendGraph, rebuilt only when the edges change"""
+
+    def __init__(self, path, loader):
+        self.path = path
+        self.loader = loader
+        self.version_path = f'{path}.edges'
+        self.graph = None
+        self.version = None
+        self.lock = threading.Lock()
+
+    def _read_version(self):
+        try:
+            with open(self.version_path, 'r') as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def get(self):
+        """The current graph"""
+        with self.lock:
+            version = self._read_version()
+            if self.graph is None or version != self.version:
+                self.graph = FriendGraph.from_store(self.loader())
+                self.version = version
+            return self.graph
+
+    def link(self, friends_data, user_id, other_id, added_on):
+        """Make two users friends on both sides of friends_data and in the cached graph
+
+        Call with the friends lock held and the store just loaded, then save
+        friends_data and call saved().
+        """
+        with self.lock:
+            for a, b in ((user_id, other_id), (other_id, user_id)):
+                entry = friends_data.setdefault(a, {'friends': [], 'activities': [], 'added_dates': {}})
+                friends = entry.setdefault('friends', [])
+                if b not in friends:
+                    friends.append(b)
+                entry.setdefault('added_dates', {})[b] = added_on
+                self.graph.add(a, b)
+
+    def unlink(self, friends_data, user_id, other_id):
+        """Remove a friendship from both sides of friends_data and from the cached graph"""
+        with self.lock:
+            for a, b in ((user_id, other_id), (other_id, user_id)):
+                try:
+                    friends_data[a]['friends'].remove(b)
+                except (KeyError, ValueError):
+                    pass
+                self.graph.remove(a, b)
+
+    def saved(self):
+        """Publish an edge change that was just saved, so other processes rebuild their graph"""
+        with self.lock:
+            version = self._read_version() + 1
+            with open(self.version_path + '.tmp', 'w') as f:
+                f.write(str(version))
+            os.replace(self.version_path + '.tmp', self.version_path)
+            self.version = version
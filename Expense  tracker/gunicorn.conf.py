@@ -0,0 +1,40 @@
+# Gunicorn settings for running the app with several workers:
+#   gunicorn -c gunicorn.conf.py app:app
+import os
+
+# One worker by default: the /events hub is per process, so with several
+# workers a client only sees events published by the worker serving its stream
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+# Threaded workers, so open /events streams don't each hold a whole worker
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+# Threads per worker kept free of /events streams for ordinary requests
+RESERVED_THREADS = int(os.environ.get('SSE_RESERVED_THREADS', 4))
+bind = os.environ.get('BIND', '127.0.0.1:5000')
+
+
+def post_fork(server, worker):
+    # Integrations stay lazy by default, so a new worker boots without importing
+    # them. Set e.g. WARM_INTEGRATIONS=sms to build them right after fork instead,
+    # trading boot time for a faster first request that uses them.
+    names = [n for n in os.environ.get('WARM_INTEGRATIONS', '').split(',') if n]
+    if names:
+        import integrations
+        integrations.warm_up(*names)
+
+    # Each open /events stream holds a thread; past the cap new streams are refused
+    import events
+    events.hub.max_streams = max(1, worker.cfg.threads - RESERVED_THREADS)
+
+    # Load every template from the bytecode cache before the first request
+    import assets
+    from app import app
+    assets.precompile_templates(app)
+
+    # Catch up on and then keep materialising recurring expenses. Every worker
+    # runs one; ticks are serialised through a file lock, so nothing is doubled.
+    from app import recurring_scheduler
+    recurring_scheduler.start()
+
+    # Roll habits, water and leaderboard over to the new day right after midnight
+    from app import daily_rollover
+    daily_rollover.start()
@@ -0,0 +1,110 @@
+import os
+import logging
+import threading
+
+# Registry of third-party integrations (SMS, ...).
+# Providers are only imported and constructed the first time they are used,
+# so importing app.py does not pay for twilio/dotenv on every worker boot.
+
+_factories = {}
+_instances = {}
+_lock = threading.Lock()
+_env_loaded = False
+
+
+def register(name, factory):
+    """Register a zero-argument factory that builds the provider for `name`"""
+    with _lock:
+        _factories[name] = factory
+        _instances.pop(name, None)
+
+
+def get(name):
+    """Return the provider for `name`, building it on first use (None if unavailable)"""
+    pid = os.getpid()
+    cached = _instances.get(name)
+    # Clients built before a fork hold sockets that must not be shared with the parent
+    if cached is not None and cached[0] == pid:
+        return cached[1]
+
+    with _lock:
+        cached = _instances.get(name)
+        if cached is not None and cached[0] == pid:
+            return cached[1]
+
+        factory = _factories.get(name)
+        if factory is None:
+            logging.warning(f"No integration registered under '{name}'")
+            return None
+
+        try:
+            provider = factory()
+        except Exception as e:
+            logging.error(f"Failed to initialize integration '{name}': {e}")
+            provider = None
+
+        _instances[name] = (pid, provider)
+        return provider
+
+
+def warm_up(*names):
+    """Build providers ahead of the first request, e.g. from a gunicorn post_fork hook"""
+    for name in names or list(_factories):
+        get(name)
+
+
+def reset(name=None):
+    """Drop cached providers so the next get() rebuilds them"""
+    with _lock:
+        if name is None:
+            _instances.clear()
+        else:
+            _instances.pop(name, None)
+
+
+def load_env():
+    """Load the .env file once, if python-dotenv is installed"""
+    global _env_loaded
+    if _env_loaded:
+        return
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        logging.warning("python-dotenv not installed. Skipping .env file.")
+    _env_loaded = True
+
+
+class SmsProvider:
+    """Thin wrapper around the Twilio client holding the sender number"""
+
+    def __init__(self, client, from_number):
+        self.client = client
+        self.from_number = from_number
+
+    def send(self, to_number, body):
+        return self.client.messages.create(body=body, from_=self.from_number, to=to_number)
+
+
+def _build_twilio():
+    load_env()
+
+    # Twilio configuration (replace with your actual credentials in production)
+    account_sid = os.environ.get('TWILIO_ACCOUNT_SID', 'your_account_sid')
+    auth_token = os.environ.get('TWILIO_AUTH_TOKEN', 'your_auth_token')
+    phone_number = os.environ.get('TWILIO_PHONE_NUMBER', '+1234567890')
+
+    if account_sid == 'your_account_sid':
+        logging.warning("Twilio credentials not configured. SMS reminders will be disabled.")
+        return None
+
+    try:
+        from twilio.rest import Client
+    except ImportError:
+        logging.warning("Twilio package not installed. SMS reminders will be disabled.")
+        return None
+
+    return SmsProvider(Client(account_sid, auth_token), phone_number)
+
+
+register('sms', _build_twilio)
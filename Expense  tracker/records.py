@@ -0,0 +1,235 @@
+import math
+import sys
+import uuid
+from array import array
+from datetime import date, datetime
+
+# Compact in-memory records for cached data.
+# The JSON files keep their current shape; these classes are what a process
+# holds resident. Each converts losslessly to and from the JSON dicts built in
+# add_expense, add_habit and add_note:
+#   - record ids are stored as 16 raw bytes instead of 36-char strings
+#   - user ids, categories and other low-cardinality strings are interned
+#   - amounts are integer minor units (cents)
+#   - dates are day ordinals, timestamps are integer microseconds
+# Anything that does not fit those encodings exactly is kept as-is, so
+# to_dict(from_dict(d)) == d always holds.
+
+_MISSING = object()
+_US_PER_DAY = 86400 * 1000000
+
+
+def intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def pack_id(value):
+    try:
+        packed = uuid.UUID(value)
+    except (TypeError, ValueError, AttributeError):
+        return value
+    return packed.bytes if str(packed) == value else value
+
+
+def unpack_id(value):
+    return str(uuid.UUID(bytes=value)) if type(value) is bytes else value
+
+
+def pack_amount(value):
+    if type(value) is float and math.isfinite(value):
+        minor = round(value * 100)
+        if minor / 100 == value:
+            return minor
+    # Not representable in whole cents (or not a finite float at all): keep the original
+    return (value,)
+
+
+def parse_amount(value):
+    """A finite float from request input; raises ValueError for anything else"""
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        amount = math.nan
+    if not math.isfinite(amount):
+        raise ValueError('Amount must be a finite number')
+    return amount
+
+
+def unpack_amount(value):
+    return value / 100 if type(value) is int else value[0]
+
+
+def pack_day(value):
+    """'2025-05-04' -> ordinal; '2025-05-04T10:00:00' -> (ordinal, 'T10:00:00')"""
+    if type(value) is not str or len(value) < 10:
+        return (None, value)
+    try:
+        day = date.fromisoformat(value[:10])
+    except ValueError:
+        return (None, value)
+    if day.isoformat() != value[:10]:
+        return (None, value)
+    if len(value) == 10:
+        return day.toordinal()
+    return (day.toordinal(), intern(value[10:]))
+
+
+def unpack_day(value):
+    if type(value) is int:
+        return date.fromordinal(value).isoformat()
+    ordinal, rest = value
+    if ordinal is None:
+        return rest
+    return date.fromordinal(ordinal).isoformat() + rest
+
+
+def pack_timestamp(value):
+    if type(value) is not str:
+        return (value,)
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return (value,)
+    if parsed.tzinfo is not None or parsed.isoformat() != value:
+        return (value,)
+    return (parsed.toordinal() * _US_PER_DAY
+            + ((parsed.hour * 60 + parsed.minute) * 60 + parsed.second) * 1000000
+            + parsed.microsecond)
+
+
+def unpack_timestamp(value):
+    if type(value) is not int:
+        return value[0]
+    ordinal, rest = divmod(value, _US_PER_DAY)
+    seconds, micro = divmod(rest, 1000000)
+    minutes, second = divmod(seconds, 60)
+    hour, minute = divmod(minutes, 60)
+    parsed = datetime.combine(date.fromordinal(ordinal), datetime.min.time())
+    return parsed.replace(hour=hour, minute=minute, second=second, microsecond=micro).isoformat()
+
+
+def pack_days(values):
+    """List of 'YYYY-MM-DD' strings -> array of ordinals (or the list itself if irregular)"""
+    if type(values) is not list:
+        return (values,)
+    packed = array('i')
+    for value in values:
+        day = pack_day(value)
+        if type(day) is not int:
+            return (values,)
+        packed.append(day)
+    return packed
+
+
+def unpack_days(value):
+    if type(value) is array:
+        return [date.fromordinal(day).isoformat() for day in value]
+    return value[0]
+
+
+def _keep(value):
+    return value
+
+
+# JSON key -> (pack, unpack); keys not listed are stored unchanged
+_CODECS = {
+    'id': (pack_id, unpack_id),
+    'user_id': (intern, _keep),
+    'category': (intern, _keep),
+    'type': (intern, _keep),
+    'frequency': (intern, _keep),
+    'color': (intern, _keep),
+    'amount': (pack_amount, unpack_amount),
+    'date': (pack_day, unpack_day),
+    'created_at': (pack_timestamp, unpack_timestamp),
+    'updated_at': (pack_timestamp, unpack_timestamp),
+    'completedDates': (pack_days, unpack_days),
+}
+
+
+class Record:
+    """Base for slotted records; subclasses list their JSON keys in FIELDS"""
+
+    FIELDS = ()
+    __slots__ = ('extra',)
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls.__new__(cls)
+        for key in cls.FIELDS:
+            if key in data:
+                pack = _CODECS.get(key, (_keep, _keep))[0]
+                setattr(record, key, pack(data[key]))
+            else:
+                setattr(record, key, _MISSING)
+        # Unknown keys are carried along untouched
+        extra = {key: value for key, value in data.items() if key not in cls.FIELDS}
+        record.extra = extra or None
+        return record
+
+    def to_dict(self):
+        result = {}
+        for key in self.FIELDS:
+            value = getattr(self, key)
+            if value is not _MISSING:
+                result[key] = _CODECS.get(key, (_keep, _keep))[1](value)
+        if self.extra:
+            result.update(self.extra)
+        return result
+
+    def get(self, key, default=None):
+        value = getattr(self, key, _MISSING) if key in self.FIELDS else _MISSING
+        if value is _MISSING:
+            if self.extra and key in self.extra:
+                return self.extra[key]
+            return default
+        return _CODECS.get(key, (_keep, _keep))[1](value)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+
+class Expense(Record):
+    FIELDS = ('id', 'user_id', 'description', 'amount', 'category', 'date', 'type')
+    __slots__ = FIELDS
+
+    @property
+    def amount_minor(self):
+        """Amount in cents, or None if the stored amount is not a whole number of cents"""
+        return self.amount if type(self.amount) is int else None
+
+    @property
+    def day(self):
+        """Day ordinal of the expense date, or None if it could not be parsed"""
+        if self.date is _MISSING:
+            return None
+        return self.date if type(self.date) is int else self.date[0]
+
+
+class Habit(Record):
+    FIELDS = ('id', 'user_id', 'name', 'category', 'frequency', 'created_at', 'completedDates', 'streak')
+    __slots__ = FIELDS
+
+
+class Note(Record):
+    FIELDS = ('id', 'user_id', 'content', 'title', 'color', 'position', 'created_at', 'updated_at')
+    __slots__ = FIELDS
+
+
+def from_dicts(cls, items):
+    return [cls.from_dict(item) for item in items]
+
+
+def to_dicts(records):
+    return [record.to_dict() for record in records]
+
+
+def group_by_user(records):
+    """Index records by their (interned) user_id"""
+    grouped = {}
+    for record in records:
+        grouped.setdefault(record.user_id, []).append(record)
+    return grouped
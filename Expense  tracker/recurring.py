@@ -0,0 +1,219 @@
+"""Recurring expense rules and the scheduler that materialises them.
+
+Rules are stored per user in recurring.json:
+
+    {user_id: [{id, description, amount, category, type, frequency,
+                start_date, occurrences, next_due, ...}]}
+
+The scheduler keeps a min-heap of (next_due, rule) across all users. A tick
+pops only the rules that are due, writes every resulting expense in one batch
+(no per-item friend activity fan-out) and pushes the rules back with their
+next due date, so a tick costs O(due items log rules). The first tick after
+start-up catches up on everything missed while the app was down.
+
+Ticks are serialised across worker processes with a file lock, and each
+scheduler reloads its heap whenever another process has changed the rules
+file. Besides the background thread started by the app, a tick can be run
+from cron:
+
+    python recurring.py
+"""
+import calendar
+import heapq
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import date, datetime, timedelta
+
+import filelock
+import records
+import snapshot
+
+RECURRING_FILE = 'recurring.json'
+TICK_SECONDS = 60
+
+DAY_STEPS = {'weekly': 7, 'biweekly': 14}
+MONTH_STEPS = {'monthly': 1, 'quarterly': 3, 'yearly': 12}
+FREQUENCIES = tuple(DAY_STEPS) + tuple(MONTH_STEPS)
+
+
+def occurrence(start, frequency, n):
+    """Date of the n-th occurrence (0-based) of a rule starting on `start`
+
+    Computed from the start date each time, so a rule starting on the 31st
+    falls on the last day of shorter months without drifting afterwards.
+    """
+    if frequency in DAY_STEPS:
+        return start + timedelta(days=DAY_STEPS[frequency] * n)
+    months = start.month - 1 + MONTH_STEPS[frequency] * n
+    year, month = start.year + months // 12, months % 12 + 1
+    return date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+
+def new_rule(data, start):
+    """Build a rule dict from request data; raises ValueError on bad input"""
+    frequency = data.get('frequency') or data.get('recurring_interval')
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Frequency must be one of: {', '.join(FREQUENCIES)}")
+    amount = records.parse_amount(data['amount'])
+    transaction_type = data.get('type', 'expense')
+    if transaction_type == 'income':
+        amount = -abs(amount)
+
+    return {
+        'id': str(uuid.uuid4()),
+        'description': data['description'],
+        'amount': amount,
+        'category': data.get('category', 'Uncategorized'),
+        'type': transaction_type,
+        'frequency': frequency,
+        'start_date': start.isoformat(),
+        'occurrences': 0,
+        'next_due': start.isoformat(),
+        'created_at': datetime.now().isoformat(),
+    }
+
+
+def load_rules(path=RECURRING_FILE):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def save_rules(rules, path=RECURRING_FILE):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(rules, f)
+    os.replace(tmp, path)
+
+
+def locked(path=RECURRING_FILE):
+    """Exclusive lock shared by every process touching the rules file"""
+    return filelock.locked(path)
+
+
+class Scheduler:
+    def __init__(self, load_expenses, save_expenses, expenses_path, path=RECURRING_FILE):
+        self.load_expenses = load_expenses
+        self.save_expenses = save_expenses
+        self.expenses_path = expenses_path
+        self.path = path
+        self.rules = {}
+        self.heap = []
+        # (inode, size, mtime) of the rules file the heap was built from
+        self.version = None
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def _reload(self):
+        """Rebuild the heap if the rules file changed since we last saw it"""
+        # save_rules() replaces the file, so even a save within the same mtime tick is seen
+        version = snapshot.signature(self.path)
+        if version == self.version:
+            return
+        self.rules = load_rules(self.path)
+        self.heap = [(rule['next_due'], user_id, rule['id'])
+                     for user_id, user_rules in self.rules.items() for rule in user_rules]
+        heapq.heapify(self.heap)
+        self.version = version
+
+    def tick(self, today=None):
+        """Materialise every occurrence due on or before `today`; returns how many were added"""
+        today = today or date.today()
+        cutoff = today.isoformat()
+
+        with locked(self.path):
+            try:
+                return self._tick(today, cutoff)
+            except Exception:
+                # Rules may have been popped or changed in memory; reload them from the file next time
+                self.version = None
+                raise
+
+    def _tick(self, today, cutoff):
+        self._reload()
+        if not self.heap or self.heap[0][0] > cutoff:
+            return 0
+
+        by_id = {}
+        created = []
+        while self.heap and self.heap[0][0] <= cutoff:
+            _, user_id, rule_id = heapq.heappop(self.heap)
+            if user_id not in by_id:
+                by_id[user_id] = {rule['id']: rule for rule in self.rules.get(user_id, [])}
+            rule = by_id[user_id].get(rule_id)
+            if rule is None:
+                continue
+
+            try:
+                start = date.fromisoformat(rule['start_date'])
+                due = date.fromisoformat(rule['next_due'])
+            except (KeyError, TypeError, ValueError):
+                # Left out of the heap until the rules file changes, without holding up the others
+                logging.error(f"Skipping malformed recurring rule {rule_id}")
+                continue
+            # Catch-up: a rule missed for several periods produces one expense per period
+            while due <= today:
+                created.append({
+                    'id': str(uuid.uuid4()),
+                    'user_id': user_id,
+                    'description': rule['description'],
+                    'amount': rule['amount'],
+                    'category': rule['category'],
+                    'date': due.isoformat(),
+                    'type': rule['type'],
+                    'recurring': True,
+                    'recurring_interval': rule['frequency'],
+                    'recurring_rule_id': rule['id'],
+                })
+                rule['occurrences'] += 1
+                due = occurrence(start, rule['frequency'], rule['occurrences'])
+            rule['next_due'] = due.isoformat()
+            heapq.heappush(self.heap, (rule['next_due'], user_id, rule_id))
+
+        if created:
+            # One write for the whole batch; the expenses go out before the
+            # rules advance, so a crash can only re-run an occurrence, never lose one
+            with filelock.locked(self.expenses_path):
+                expenses = self.load_expenses()
+                expenses.extend(created)
+                self.save_expenses(expenses)
+        save_rules(self.rules, self.path)
+        self.version = snapshot.signature(self.path)
+
+        logging.info(f"Recurring scheduler added {len(created)} expenses")
+        return len(created)
+
+    def _run(self, interval):
+        while not self.stopped.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                logging.error(f"Recurring scheduler tick failed: {e}")
+            self.stopped.wait(interval)
+
+    def start(self, interval=TICK_SECONDS):
+        """Run a catch-up tick now and then one every `interval` seconds in a daemon thread"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, args=(interval,), name='recurring-scheduler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def main():
+    # Use the app's own store helpers so the CLI writes exactly where the app reads
+    from app import EXPENSES_FILE, load_expenses, save_expenses
+
+    added = Scheduler(load_expenses, save_expenses, EXPENSES_FILE).tick()
+    print(f'Added {added} recurring expenses')
+
+
+if __name__ == '__main__':
+    main()
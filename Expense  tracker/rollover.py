@@ -0,0 +1,226 @@
+"""Daily rollover of habits, water and leaderboard stats.
+
+Once per day, in a single pass over all users:
+  - habit streaks are recomputed from completedDates according to each
+    habit's frequency, so a missed day (or week) resets the streak
+  - yesterday's water intake is finalised into history and `current` is
+    reset; the water streaks come from each user's rollup (water_stats.py)
+  - leaderboard.json is rebuilt from the figures gathered during the passes
+
+Each store is updated in one pass under the same file lock the app's write
+routes take, and saved once, so nothing a route writes meanwhile is lost.
+rollover.json records which stages are done; every stage only derives values
+from the stored data, so an interrupted stage is simply run again. The job
+runs in a background thread (and from cron, via `python rollover.py`), never
+inside a request.
+
+Two deliberate departures from a chunked job that replaces every per-request
+check: the stores are whole JSON files, so saving per chunk would rewrite the
+entire file once per chunk (quadratic in the store size) where one pass saves
+it once; and a route still applies the new day to the one record it touches,
+through the same finalize_water() and habit_streak() the job uses, so a
+request made after midnight but before the job has run (or after it failed)
+never shows yesterday's count. That check is a date comparison on a single
+record; the whole-store work happens here.
+"""
+import json
+import logging
+import os
+import threading
+from datetime import date, timedelta
+
+import filelock
+import water_stats
+
+STATE_FILE = 'rollover.json'
+LEADERBOARD_FILE = 'leaderboard.json'
+CHECK_SECONDS = 60
+
+
+def habit_streak(habit, today):
+    """Current streak of a habit as of `today`, in days or weeks depending on its frequency
+
+    A streak is still alive if the latest period is not completed yet, e.g. a
+    daily habit done every day up to yesterday but not yet today.
+    """
+    completed = set(habit.get('completedDates') or [])
+    if not completed:
+        return 0
+
+    if habit.get('frequency') == 'weekly':
+        weeks = set()
+        for value in completed:
+            try:
+                weeks.add(date.fromisoformat(value[:10]).isocalendar()[:2])
+            except ValueError:
+                continue
+        monday = today - timedelta(days=today.weekday())
+        if today.isocalendar()[:2] not in weeks:
+            monday -= timedelta(days=7)
+        streak = 0
+        while monday.isocalendar()[:2] in weeks:
+            streak += 1
+            monday -= timedelta(days=7)
+        return streak
+
+    day = today if today.isoformat() in completed else today - timedelta(days=1)
+    streak = 0
+    while day.isoformat() in completed:
+        streak += 1
+        day -= timedelta(days=1)
+    return streak
+
+
+def finalize_water(user_water, today):
+    """Close out the user's last water day and start `today`; returns False if already current"""
+    today_str = today.isoformat()
+    last = user_water.get('last_update_date')
+    if last == today_str:
+        return False
+
+    history = user_water.setdefault('history', [])
+    current = user_water.get('current', 0)
+    # update_water writes history as it goes; only a missing last entry needs adding
+    if last and current and not (history and history[-1].get('date') == last):
+        history.append({'date': last, 'amount': current})
+
+    user_water['current'] = 0
+    user_water['last_update_date'] = today_str
+    return True
+
+
+def _read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def _write_json(path, data):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class DailyRollover:
+    def __init__(self, load_habits, save_habits, load_water, save_water, habits_path, water_path,
+                 state_path=STATE_FILE, leaderboard_path=LEADERBOARD_FILE):
+        self.load_habits = load_habits
+        self.save_habits = save_habits
+        self.load_water = load_water
+        self.save_water = save_water
+        self.habits_path = habits_path
+        self.water_path = water_path
+        self.state_path = state_path
+        self.leaderboard_path = leaderboard_path
+        self.done_for = None
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def _checkpoint(self, state):
+        _write_json(self.state_path, state)
+
+    def _roll_habits(self, today, board):
+        with filelock.locked(self.habits_path):
+            habits = self.load_habits()
+            for habit in habits:
+                habit['streak'] = habit_streak(habit, today)
+                entry = board.setdefault(habit.get('user_id'), {})
+                entry['habit_streak'] = max(entry.get('habit_streak', 0), habit['streak'])
+                entry['habits'] = entry.get('habits', 0) + 1
+            self.save_habits(habits)
+
+    def _roll_water(self, today, board):
+        with filelock.locked(self.water_path):
+            water = self.load_water()
+            for user_water in water.values():
+                finalize_water(user_water, today)
+            self.save_water(water)
+
+        # The rollups are separate files; reading them doesn't need to hold up water writes
+        for user_id in water:
+            entry = board.setdefault(user_id, {})
+            rollup = water_stats.load(user_id)
+            if rollup is not None:
+                stats = water_stats.summary(rollup, today.toordinal())
+                entry['water_streak'] = stats['current_streak']
+                entry['water_best_streak'] = stats['best_streak']
+                entry['water_goal_hit_rate'] = stats['goal_hit_rate']
+
+    def run(self, today=None):
+        """Run (or finish) the rollover for `today`; returns the final state"""
+        today = today or date.today()
+        today_str = today.isoformat()
+
+        with filelock.locked(self.state_path):
+            state = _read_json(self.state_path, {})
+            if state.get('date') != today_str:
+                state = {'date': today_str, 'stage': 'habits', 'leaderboard': {}}
+            board = state['leaderboard']
+
+            if state['stage'] == 'habits':
+                self._roll_habits(today, board)
+                state['stage'] = 'water'
+                self._checkpoint(state)
+
+            if state['stage'] == 'water':
+                self._roll_water(today, board)
+                state['stage'] = 'leaderboard'
+                self._checkpoint(state)
+
+            if state['stage'] == 'leaderboard':
+                _write_json(self.leaderboard_path, {'date': today_str, 'users': board})
+                state['stage'] = 'done'
+                state['leaderboard'] = {}
+                self._checkpoint(state)
+
+        self.done_for = today
+        logging.info(f"Daily rollover finished for {today_str}")
+        return state
+
+    def ensure(self, today=None):
+        """Run today's rollover unless it already ran (in this or another process)"""
+        today = today or date.today()
+        if self.done_for == today:
+            return
+        state = _read_json(self.state_path, {})
+        if state.get('date') == today.isoformat() and state.get('stage') == 'done':
+            self.done_for = today
+            return
+        self.run(today)
+
+    def _loop(self, interval):
+        while not self.stopped.is_set():
+            try:
+                self.ensure()
+            except Exception as e:
+                logging.error(f"Daily rollover failed: {e}")
+            self.stopped.wait(interval)
+
+    def start(self, interval=CHECK_SECONDS):
+        """Check every `interval` seconds in a daemon thread and roll over when the date changes"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._loop, args=(interval,), name='daily-rollover', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def load_leaderboard(path=LEADERBOARD_FILE):
+    return _read_json(path, {'date': None, 'users': {}})
+
+
+def main():
+    # Use the app's own store helpers so snapshots and search stay in sync
+    from app import daily_rollover
+
+    state = daily_rollover.run()
+    print(f"Rollover for {state['date']}: {state['stage']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+import re
+import threading
+from bisect import bisect_left, insort
+
+# Per-user inverted index over notes and expenses, used by /search.
+# Each user has a sorted term list (for prefix lookups with bisect) and a
+# postings map term -> {doc key: weighted term frequency}, so a query only
+# touches the postings of the terms it matches.
+#
+# A user's index is built from their own records on their first search and
+# then kept current by the note/expense routes. Each source gives a per-user
+# version (which changes only when that user's records in it change) and a
+# loader for one user's records: if another worker changed a user's records,
+# that user's documents from that source are reloaded on their next search,
+# and writes by other users never invalidate it.
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Which fields are indexed for each document type, and how much a hit counts
+FIELDS = {
+    'note': (('title', 2.0), ('content', 1.0)),
+    'expense': (('description', 2.0), ('category', 1.0)),
+}
+
+# Fields returned with each hit so the client can render results directly
+DISPLAY = {
+    'note': ('title', 'color', 'updated_at'),
+    'expense': ('description', 'category', 'amount', 'date', 'type'),
+}
+
+# A prefix match counts for less than an exact term match
+PREFIX_WEIGHT = 0.5
+
+
+def tokenize(text):
+    if not isinstance(text, str):
+        return []
+    return TOKEN_RE.findall(text.lower())
+
+
+class _UserIndex:
+    __slots__ = ('terms', 'postings', 'docs', 'doc_terms', 'origins', 'versions')
+
+    def __init__(self):
+        self.terms = []
+        self.postings = {}
+        self.docs = {}
+        self.doc_terms = {}
+        # doc key -> source it came from, source -> store version it was loaded at
+        self.origins = {}
+        self.versions = {}
+
+
+class SearchIndex:
+    def __init__(self, sources):
+        """`sources` maps source name -> (document type, version(user_id), loader(user_id) returning dicts)"""
+        self.sources = sources
+        self.users = {}
+        self.lock = threading.Lock()
+
+    def _version(self, source, user_id):
+        return self.sources[source][1](user_id)
+
+    def _index(self, user_id):
+        """The user's index, reloading the sources that changed since they were loaded"""
+        index = self.users.get(user_id)
+        if index is None:
+            index = self.users[user_id] = _UserIndex()
+        for source, (kind, _, loader) in self.sources.items():
+            version = self._version(source, user_id)
+            if source in index.versions and index.versions[source] == version:
+                continue
+            for key in [key for key, origin in index.origins.items() if origin == source]:
+                self._remove(index, key)
+            for doc in loader(user_id):
+                if doc.get('user_id') == user_id:
+                    self._add(index, source, kind, doc)
+            index.versions[source] = version
+        return index
+
+    def _add(self, index, source, kind, doc):
+        doc_id = doc.get('id')
+        if doc_id is None:
+            return
+        key = (kind, doc_id)
+        self._remove(index, key)
+        index.docs[key] = {field: doc.get(field) for field in DISPLAY[kind]}
+        index.origins[key] = source
+
+        weights = {}
+        for field, weight in FIELDS[kind]:
+            for term in tokenize(doc.get(field)):
+                weights[term] = weights.get(term, 0.0) + weight
+        index.doc_terms[key] = tuple(weights)
+        for term, weight in weights.items():
+            postings = index.postings.get(term)
+            if postings is None:
+                postings = index.postings[term] = {}
+                insort(index.terms, term)
+            postings[key] = weight
+
+    def _remove(self, index, key):
+        if index.docs.pop(key, None) is None:
+            return
+        del index.origins[key]
+        for term in index.doc_terms.pop(key):
+            postings = index.postings[term]
+            del postings[key]
+            if not postings:
+                del index.postings[term]
+                del index.terms[bisect_left(index.terms, term)]
+
+    def put(self, source, doc):
+        """Index a document just added to or updated in `source` (call after the store is saved)"""
+        with self.lock:
+            index = self.users.get(doc.get('user_id'))
+            # Not built yet; the user's first search loads it from the stores
+            if index is None or source not in index.versions:
+                return
+            self._add(index, source, self.sources[source][0], doc)
+            # The route just saved this store, so the user's new version is our own write
+            index.versions[source] = self._version(source, doc.get('user_id'))
+
+    def discard(self, source, user_id, doc_id):
+        """Drop a document deleted from `source` (call after the store is saved)"""
+        with self.lock:
+            index = self.users.get(user_id)
+            if index is None or source not in index.versions:
+                return
+            self._remove(index, (self.sources[source][0], doc_id))
+            index.versions[source] = self._version(source, user_id)
+
+    def search(self, user_id, query, kinds=None, limit=20):
+        """Ranked hits for `query`; the last query term is also matched as a prefix"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self.lock:
+            index = self._index(user_id)
+
+            scores = {}
+            for position, term in enumerate(terms):
+                matched = {term: 1.0} if term in index.postings else {}
+                # Every term is a prefix of itself; other completions score lower
+                if position == len(terms) - 1:
+                    i = bisect_left(index.terms, term)
+                    while i < len(index.terms) and index.terms[i].startswith(term):
+                        matched.setdefault(index.terms[i], PREFIX_WEIGHT)
+                        i += 1
+
+                # Rarer terms carry more weight
+                for candidate, factor in matched.items():
+                    postings = index.postings[candidate]
+                    idf = 1.0 + len(index.docs) / (1.0 + len(postings))
+                    for key, weight in postings.items():
+                        scores[key] = scores.get(key, 0.0) + weight * factor * idf
+
+            if kinds:
+                scores = {key: score for key, score in scores.items() if key[0] in kinds}
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+            return [dict(index.docs[key], type=key[0], id=key[1], score=round(score, 3))
+                    for key, score in ranked]
@@ -0,0 +1,278 @@
+"""Read-only binary snapshots of the JSON stores, shared across workers.
+
+Every time a store is saved, a snapshot of it is written next to the other
+snapshots and published by atomically replacing the CURRENT manifest. Workers
+memory-map the snapshot files read-only, so all of them share one copy of the
+data in the page cache instead of each parsing and holding its own, and a
+lookup only decodes the records of the user it asks for.
+
+Snapshot file layout (little-endian):
+
+    header   magic b'LMSNAP2\\0', n_keys u32, n_records u32
+    keys     n_keys x (key_offset u64, key_length u32, first_record u32, record_count u32,
+             digest u64), sorted by key bytes
+    records  (n_records + 1) x u64 offsets into the data area
+    data     key bytes followed by one compact JSON document per record
+
+A key's digest is a hash of its records, so `version()` tells whether one
+user's records changed between two snapshots without decoding them.
+
+CURRENT is a small JSON manifest {store: {generation, file, source}}, where
+`source` is the (inode, size, mtime) signature of the JSON file the snapshot
+was built from. Stores are written with write_source(), which replaces the
+file atomically, so every save gets a new inode and a signature that no
+other save shares. A snapshot is only trusted while its source file still
+has the recorded signature; if anything wrote the JSON file without
+publishing, readers fall back to the JSON store.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+import filelock
+
+SNAPSHOT_DIR = 'snapshots'
+MAGIC = b'LMSNAP2\0'
+KEEP_GENERATIONS = 2
+
+# Stores that are snapshotted: JSON file and the field records are looked up by
+STORES = {
+    'users': ('users.json', 'id'),
+    'expenses': ('expenses.json', 'user_id'),
+    'habits': ('habits.json', 'user_id'),
+    'notes': ('notes.json', 'user_id'),
+}
+
+_HEADER = struct.Struct('<8sII')
+_KEY = struct.Struct('<QIIIQ')
+_OFFSET = struct.Struct('<Q')
+
+
+def signature(path):
+    """(inode, size, mtime) of `path`, or None if it does not exist"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+def write_source(path, data):
+    """Atomically replace the JSON store at `path`; returns the signature of the written file"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.')
+    try:
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+            f.flush()
+            st = os.fstat(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+def _group(data, key_field):
+    """Map each key to its records: list stores by `key_field`, dict stores by their own keys"""
+    groups = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            groups[key] = [value]
+    else:
+        for record in data:
+            key = record.get(key_field)
+            if key is not None:
+                groups.setdefault(key, []).append(record)
+    return groups
+
+
+def build(data, key_field='user_id'):
+    """Encode a store (list of records or dict keyed by user) as snapshot bytes"""
+    groups = sorted((str(key).encode('utf-8'), records) for key, records in _group(data, key_field).items())
+
+    keys = []
+    docs = []
+    for key, records in groups:
+        encoded = [json.dumps(record, separators=(',', ':')).encode('utf-8') for record in records]
+        digest = int.from_bytes(hashlib.blake2b(b'\n'.join(encoded), digest_size=8).digest(), 'little')
+        keys.append((key, len(docs), len(records), digest))
+        docs.extend(encoded)
+
+    data_start = _HEADER.size + _KEY.size * len(keys) + _OFFSET.size * (len(docs) + 1)
+    parts = [_HEADER.pack(MAGIC, len(keys), len(docs))]
+    offset = data_start
+    for key, first, count, digest in keys:
+        parts.append(_KEY.pack(offset, len(key), first, count, digest))
+        offset += len(key)
+    for doc in docs:
+        parts.append(_OFFSET.pack(offset))
+        offset += len(doc)
+    parts.append(_OFFSET.pack(offset))
+    parts.extend(key for key, _, _, _ in keys)
+    parts.extend(docs)
+    return b''.join(parts)
+
+
+class _Mapped:
+    """One memory-mapped snapshot file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        magic, self.n_keys, self.n_records = _HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a snapshot file')
+        self.keys_at = _HEADER.size
+        self.records_at = self.keys_at + _KEY.size * self.n_keys
+
+    def _key(self, i):
+        return _KEY.unpack_from(self.map, self.keys_at + i * _KEY.size)
+
+    def _find(self, key):
+        lo, hi = 0, self.n_keys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset, length, first, count, digest = self._key(mid)
+            candidate = self.view[offset:offset + length]
+            if candidate == key:
+                return first, count, digest
+            if bytes(candidate) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def records(self, key):
+        found = self._find(str(key).encode('utf-8'))
+        if found is None:
+            return []
+        first, count, _ = found
+        at = self.records_at + first * _OFFSET.size
+        offsets = struct.unpack_from(f'<{count + 1}Q', self.map, at)
+        # Only this user's records are copied out of the shared mapping and decoded
+        return [json.loads(self.view[offsets[i]:offsets[i + 1]].tobytes()) for i in range(count)]
+
+
+class SnapshotStore:
+    def __init__(self, snapshot_dir=SNAPSHOT_DIR):
+        self.dir = snapshot_dir
+        self.manifest_path = os.path.join(snapshot_dir, 'CURRENT')
+        self.manifest = {}
+        self.manifest_version = None
+        self.mapped = {}
+        self.lock = threading.Lock()
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def publish(self, store, data, source_path, key_field='user_id', source=None):
+        """Write a new generation of `store` from `data`, which was saved to `source_path`
+
+        `source` is the signature write_source() returned for that save; the
+        snapshot is only published if the file still is that exact version.
+        """
+        if source is None:
+            return False
+        os.makedirs(self.dir, exist_ok=True)
+        blob = build(data, key_field)
+
+        with filelock.locked(self.manifest_path):
+            # Another process saved the store after us; its own publish will be newer
+            if signature(source_path) != source:
+                return False
+
+            manifest = self._read_manifest()
+            generation = manifest.get(store, {}).get('generation', 0) + 1
+            filename = f'{store}.{generation}.snap'
+            path = os.path.join(self.dir, filename)
+            with open(path + '.tmp', 'wb') as f:
+                f.write(blob)
+            os.replace(path + '.tmp', path)
+
+            manifest[store] = {'generation': generation, 'file': filename, 'source': source}
+            with open(self.manifest_path + '.tmp', 'w') as f:
+                json.dump(manifest, f)
+            os.replace(self.manifest_path + '.tmp', self.manifest_path)
+
+            # Readers still holding an older mapping keep it valid after unlink
+            try:
+                os.remove(os.path.join(self.dir, f'{store}.{generation - KEEP_GENERATIONS}.snap'))
+            except OSError:
+                pass
+        return True
+
+    def _current(self, store, source_path):
+        # CURRENT is replaced on every publish, so two publishes within one mtime tick still differ
+        version = signature(self.manifest_path)
+        if version is None:
+            return None
+        if version != self.manifest_version:
+            self.manifest = self._read_manifest()
+            self.manifest_version = version
+
+        entry = self.manifest.get(store)
+        if entry is None or signature(source_path) != entry.get('source'):
+            return None
+
+        mapped = self.mapped.get(store)
+        if mapped is None or mapped[0] != entry['generation']:
+            try:
+                snapshot = _Mapped(os.path.join(self.dir, entry['file']))
+            except (OSError, ValueError):
+                return None
+            # Dropped mappings are closed once the last reader lets go of them
+            self.mapped[store] = mapped = (entry['generation'], snapshot)
+        return mapped[1]
+
+    def version(self, store, key, source_path):
+        """Digest of the records under `key` (0 if none), or None if no up-to-date snapshot exists"""
+        with self.lock:
+            snapshot = self._current(store, source_path)
+        if snapshot is None:
+            return None
+        found = snapshot._find(str(key).encode('utf-8'))
+        return found[2] if found else 0
+
+    def get(self, store, key, source_path):
+        """Records of `store` under `key`, or None if no up-to-date snapshot exists"""
+        with self.lock:
+            snapshot = self._current(store, source_path)
+        if snapshot is None:
+            return None
+        return snapshot.records(key)
+
+
+def main(argv=None):
+    """Publish snapshots of every store from the JSON files in the working directory"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Publish read snapshots of the JSON stores')
+    parser.add_argument('--snapshot-dir', default=SNAPSHOT_DIR)
+    args = parser.parse_args(argv)
+
+    snapshots = SnapshotStore(args.snapshot_dir)
+    for store, (path, key_field) in STORES.items():
+        source = signature(path)
+        if source is None:
+            continue
+        with open(path, 'r') as f:
+            data = json.load(f)
+        snapshots.publish(store, data, path, key_field, source)
+        print(f'{store}: published {len(data)} records')
+
+
+if __name__ == '__main__':
+    main()
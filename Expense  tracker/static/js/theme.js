@@ -0,0 +1,141 @@
+// Shared by every page: theme toggle and the animated canvas backgrounds.
+// Pages create the animations they use, e.g. `new StarsAnimation()`.
+
+// Theme toggle functionality
+const themeToggle = document.getElementById('themeToggle');
+const body = document.body;
+
+// Check for saved theme preference or default to dark
+const savedTheme = localStorage.getItem('theme') || 'dark';
+body.className = savedTheme;
+themeToggle.textContent = savedTheme === 'dark' ? '🌙' : '☀️';
+
+// Toggle theme
+themeToggle.addEventListener('click', () => {
+    if (body.className === 'dark') {
+        body.className = 'light';
+        themeToggle.textContent = '☀️';
+        localStorage.setItem('theme', 'light');
+    } else {
+        body.className = 'dark';
+        themeToggle.textContent = '🌙';
+        localStorage.setItem('theme', 'dark');
+    }
+});
+
+// Canvas animations
+class StarsAnimation {
+    constructor() {
+        this.canvas = document.getElementById('starsCanvas');
+        this.ctx = this.canvas.getContext('2d');
+        this.stars = [];
+        this.resize();
+        this.init();
+        this.animate();
+
+        window.addEventListener('resize', () => this.resize());
+    }
+
+    resize() {
+        this.canvas.width = window.innerWidth;
+        this.canvas.height = window.innerHeight;
+        this.init();
+    }
+
+    init() {
+        this.stars = [];
+        const numStars = Math.floor(this.canvas.width * this.canvas.height / 1000);
+
+        for (let i = 0; i < numStars; i++) {
+            this.stars.push({
+                x: Math.random() * this.canvas.width,
+                y: Math.random() * this.canvas.height,
+                radius: Math.random() * 1.5,
+                opacity: Math.random() * 0.5 + 0.5
+            });
+        }
+    }
+
+    animate() {
+        this.ctx.clearRect(0, 0, this.canvas.width, this.canvas.height);
+
+        this.stars.forEach(star => {
+            this.ctx.beginPath();
+            this.ctx.arc(star.x, star.y, star.radius, 0, Math.PI * 2);
+            this.ctx.fillStyle = `rgba(255, 255, 255, ${star.opacity})`;
+            this.ctx.fill();
+
+            // Twinkle effect
+            star.opacity += Math.random() * 0.01 - 0.005;
+            star.opacity = Math.max(0.5, Math.min(1, star.opacity));
+        });
+
+        requestAnimationFrame(() => this.animate());
+    }
+}
+
+class NeonAnimation {
+    constructor() {
+        this.canvas = document.getElementById('neonCanvas');
+        this.ctx = this.canvas.getContext('2d');
+        this.particles = [];
+        this.resize();
+        this.init();
+        this.animate();
+
+        window.addEventListener('resize', () => this.resize());
+    }
+
+    resize() {
+        this.canvas.width = window.innerWidth;
+        this.canvas.height = window.innerHeight;
+        this.init();
+    }
+
+    init() {
+        this.particles = [];
+        const numParticles = 50;
+
+        for (let i = 0; i < numParticles; i++) {
+            this.particles.push({
+                x: Math.random() * this.canvas.width,
+                y: Math.random() * this.canvas.height,
+                size: Math.random() * 2 + 1,
+                speedX: Math.random() * 1 - 0.5,
+                speedY: Math.random() * 1 - 0.5,
+                color: this.getRandomColor()
+            });
+        }
+    }
+
+    getRandomColor() {
+        const colors = ['#9333ea', '#ec4899', '#10b981', '#3b82f6'];
+        return colors[Math.floor(Math.random() * colors.length)];
+    }
+
+    animate() {
+        this.ctx.clearRect(0, 0, this.canvas.width, this.canvas.height);
+
+        this.particles.forEach(particle => {
+            this.ctx.beginPath();
+            this.ctx.arc(particle.x, particle.y, particle.size, 0, Math.PI * 2);
+            this.ctx.fillStyle = particle.color;
+            this.ctx.fill();
+
+            // Move particles
+            particle.x += particle.speedX;
+            particle.y += particle.speedY;
+
+            // Bounce off edges
+            if (particle.x < 0 || particle.x > this.canvas.width) {
+                particle.speedX *= -1;
+            }
+
+            if (particle.y < 0 || particle.y > this.canvas.height) {
+                particle.speedY *= -1;
+            }
+        });
+
+        requestAnimationFrame(() => this.animate());
+    }
+}
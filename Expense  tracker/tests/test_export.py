@@ -0,0 +1,141 @@
+import csv
+import io
+import json
+import zipfile
+from datetime import date
+
+import pytest
+
+import archive
+import export
+
+TRICKY = [
+    {'id': 'a', 'amount': -1234.5e-3, 'big': 12345678901234567890, 'exp': 1E+10, 'zero': 0, 'neg': -0.0},
+    {'flags': [True, False, None], 'empty': {}, 'nested': {'list': [[], [1, [2, [3]]]]}},
+    {'text': 'quote " backslash \\ slash / tab \t newline \n', 'unicode': 'café ✓ 𝄞', 'escaped': 'é'},
+    [],
+    'just a string with , and ] and }',
+    -7,
+    3.25,
+    True,
+    False,
+    None,
+]
+
+SPACED = '  [\n\t{ "id" : "x" ,\r\n "n" : 10 }  ,\n  null ,  true,false , 1e5  ,  -2 \n]\n  '
+
+
+def write(path, text):
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64 * 1024])
+@pytest.mark.parametrize('text', [json.dumps(TRICKY), json.dumps(TRICKY, indent=3), SPACED, '[]', ' [ ] '])
+def test_iter_array_matches_json_load(tmp_path, monkeypatch, chunk_size, text):
+    monkeypatch.setattr(export, 'CHUNK_SIZE', chunk_size)
+    path = write(tmp_path / 'store.json', text)
+    assert list(export.iter_array(path)) == json.loads(text)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 5, 64 * 1024])
+def test_iter_object_matches_json_load(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(export, 'CHUNK_SIZE', chunk_size)
+    data = {'user-1': {'goal': 2000, 'history': [{'date': '2025-01-01', 'amount': 1500}]},
+            'we"ird ké y': TRICKY, '': None, '123': 1.5}
+    path = write(tmp_path / 'store.json', json.dumps(data, indent=1))
+    assert dict(export.iter_object(path)) == data
+    assert list(export.iter_object(path)) == list(data.items())
+
+
+def test_missing_store_yields_nothing(tmp_path):
+    assert list(export.iter_array(str(tmp_path / 'missing.json'))) == []
+    assert list(export.iter_object(str(tmp_path / 'missing.json'))) == []
+
+
+@pytest.mark.parametrize('text', ['[1,,2]', '[1 2]', '[1, 2', '[tru]', '{"a" 1}', '{"a": 1,}', '"a"'])
+def test_malformed_stores_raise(tmp_path, monkeypatch, text):
+    monkeypatch.setattr(export, 'CHUNK_SIZE', 2)
+    path = write(tmp_path / 'store.json', text)
+    reader = export.iter_object if text.startswith('{') else export.iter_array
+    with pytest.raises(ValueError):
+        list(reader(path))
+
+
+USER = 'user-1'
+OTHER = 'user-2'
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    """Store files in a scratch working directory, with the older half already archived"""
+    monkeypatch.chdir(tmp_path)
+    expenses = [
+        {'id': f'e{i}', 'user_id': USER if i % 3 else OTHER, 'description': f'item, "{i}"', 'amount': i * 1.25,
+         'category': 'Food', 'date': f'2024-{i % 12 + 1:02d}-15', 'type': 'expense'}
+        for i in range(40)
+    ]
+    habits = [{'id': 'h1', 'user_id': USER, 'name': 'Read', 'category': 'Learning', 'frequency': 'daily',
+               'created_at': '2024-01-01T08:00:00', 'streak': 2, 'completedDates': ['2024-01-01', '2024-01-02']}]
+    notes = [{'id': 'n1', 'user_id': OTHER, 'title': 'Hi', 'content': 'line one\nline two', 'color': '#fff',
+              'created_at': '2024-01-01T08:00:00', 'updated_at': '2024-01-02T08:00:00'}]
+    water = {USER: {'goal': 2000, 'current': 0, 'history': [{'date': f'2024-{m:02d}-01', 'amount': m * 100}
+                                                            for m in range(1, 13)]}}
+    paths = {}
+    for store, data in (('expenses', expenses), ('habits', habits), ('notes', notes), ('water', water),
+                        ('friends', {})):
+        paths[store] = write(tmp_path / f'{store}.json', json.dumps(data))
+    archive.archive(horizon_days=0, today=date(2024, 7, 1), stores={
+        'expenses': paths['expenses'], 'water': paths['water'], 'friends': paths['friends']})
+    paths.pop('friends')
+    return {'paths': paths, 'expenses': expenses, 'habits': habits, 'notes': notes, 'water': water}
+
+
+def test_iter_records_puts_archived_records_first(stores):
+    hot = json.load(open(stores['paths']['expenses']))
+    assert hot and len(hot) < len(stores['expenses'])
+
+    exported = list(export.iter_records('expenses', USER, stores['paths']))
+    mine = [e for e in stores['expenses'] if e['user_id'] == USER]
+    assert sorted(e['id'] for e in exported) == sorted(e['id'] for e in mine)
+    # Archived (older than the cutoff) first, then the hot store in its own order
+    cold = [e for e in exported if e['date'] < '2024-07-01']
+    assert exported[:len(cold)] == cold
+    assert exported[len(cold):] == [e for e in hot if e['user_id'] == USER]
+
+    water = list(export.iter_records('water', USER, stores['paths']))
+    assert [entry['date'] for entry in water] == [f'2024-{m:02d}-01' for m in range(1, 13)]
+    assert all(entry['user_id'] == USER for entry in water)
+
+    assert len(list(export.iter_records('expenses', None, stores['paths']))) == len(stores['expenses'])
+
+
+@pytest.mark.parametrize('chunk_size', [1, 100, 64 * 1024])
+@pytest.mark.parametrize('user_id', [USER, None])
+def test_ndjson_export(stores, monkeypatch, chunk_size, user_id):
+    monkeypatch.setattr(export, 'CHUNK_SIZE', chunk_size)
+    body = b''.join(export.ndjson_chunks(user_id, stores['paths'])).decode('utf-8')
+    lines = [json.loads(line) for line in body.splitlines()]
+    expected = [{'store': store, 'data': record} for store in stores['paths']
+                for record in export.iter_records(store, user_id, stores['paths'])]
+    assert lines == expected
+
+
+@pytest.mark.parametrize('chunk_size', [1, 100, 64 * 1024])
+@pytest.mark.parametrize('user_id', [USER, None])
+def test_zip_export(stores, monkeypatch, chunk_size, user_id):
+    monkeypatch.setattr(export, 'CHUNK_SIZE', chunk_size)
+    body = b''.join(export.zip_chunks(user_id, stores['paths']))
+
+    with zipfile.ZipFile(io.BytesIO(body)) as bundle:
+        assert bundle.testzip() is None
+        assert bundle.namelist() == [f'{store}.csv' for store in stores['paths']]
+        for store in stores['paths']:
+            columns = export.COLUMNS[store] if user_id is not None else ('user_id',) + export.COLUMNS[store]
+            with bundle.open(f'{store}.csv') as member:
+                rows = list(csv.reader(io.TextIOWrapper(member, encoding='utf-8', newline='')))
+            assert rows[0] == list(columns)
+            expected = [['' if record.get(column) is None else str(export._csv_value(record.get(column)))
+                         for column in columns]
+                        for record in export.iter_records(store, user_id, stores['paths'])]
+            assert rows[1:] == expected
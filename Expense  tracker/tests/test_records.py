@@ -0,0 +1,132 @@
+import json
+import math
+import uuid
+from datetime import datetime
+
+import pytest
+
+import archive
+import records
+
+USER = str(uuid.uuid4())
+
+EXPENSES = [
+    # As add_expense writes them
+    {'id': str(uuid.uuid4()), 'user_id': USER, 'description': 'Groceries', 'amount': 42.5,
+     'category': 'Food', 'date': '2025-05-04', 'type': 'expense'},
+    {'id': str(uuid.uuid4()), 'user_id': USER, 'description': 'Salary', 'amount': -2500.0,
+     'category': 'Income', 'date': datetime(2025, 5, 1, 9, 30, 15, 123456).isoformat(), 'type': 'income'},
+    # Recurring occurrences carry extra keys
+    {'id': str(uuid.uuid4()), 'user_id': USER, 'description': 'Rent', 'amount': 900.0, 'category': 'Housing',
+     'date': '2025-05-01', 'type': 'expense', 'recurring': True, 'recurring_interval': 'monthly',
+     'recurring_rule_id': str(uuid.uuid4())},
+    # Values that don't fit the compact encodings
+    {'id': 'legacy-1', 'user_id': USER, 'description': 'Odd', 'amount': 0.1 + 0.2, 'category': 'Misc',
+     'date': '04/05/2025', 'type': 'expense'},
+    {'id': str(uuid.uuid4()).upper(), 'user_id': USER, 'description': 'Int amount', 'amount': 7,
+     'date': '2025-02-30'},
+    {'id': str(uuid.uuid4()), 'user_id': USER, 'description': 'Huge', 'amount': 1e300, 'date': ''},
+    {'user_id': USER, 'description': 'No id or date', 'amount': '12.00'},
+]
+
+HABITS = [
+    {'id': str(uuid.uuid4()), 'user_id': USER, 'name': 'Read', 'category': 'Learning', 'frequency': 'daily',
+     'created_at': datetime(2025, 1, 1, 8, 0).isoformat(), 'completedDates': ['2025-01-01', '2025-01-02'],
+     'streak': 2},
+    {'id': str(uuid.uuid4()), 'user_id': USER, 'name': 'Run', 'frequency': 'weekly',
+     'created_at': '2025-01-01T08:00:00+02:00', 'completedDates': ['2025-01-01', 'someday'], 'streak': 0},
+]
+
+NOTES = [
+    {'id': str(uuid.uuid4()), 'user_id': USER, 'content': 'Buy milk', 'title': 'Untitled Note', 'color': '#f9ca24',
+     'position': {'x': 10, 'y': 20}, 'created_at': datetime(2025, 3, 3).isoformat(),
+     'updated_at': datetime(2025, 3, 4, 12, 0, 0, 1).isoformat()},
+]
+
+
+@pytest.mark.parametrize('cls, data', [(records.Expense, d) for d in EXPENSES]
+                         + [(records.Habit, d) for d in HABITS]
+                         + [(records.Note, d) for d in NOTES])
+def test_round_trip(cls, data):
+    record = cls.from_dict(data)
+    assert record.to_dict() == data
+    assert list(record.to_dict()) == [key for key in cls.FIELDS if key in data] + \
+        [key for key in data if key not in cls.FIELDS]
+    for key, value in data.items():
+        assert record.get(key) == value
+
+
+def test_compact_encodings_are_used():
+    expense = records.Expense.from_dict(EXPENSES[0])
+    assert expense.id == uuid.UUID(EXPENSES[0]['id']).bytes
+    assert expense.amount_minor == 4250
+    assert expense.day == datetime(2025, 5, 4).toordinal()
+    assert expense.extra is None
+
+    odd = records.Expense.from_dict(EXPENSES[3])
+    assert odd.amount_minor is None
+    assert odd.day is None
+
+
+@pytest.mark.parametrize('value', [math.inf, -math.inf, math.nan])
+def test_non_finite_amounts_are_kept_as_is(value):
+    packed = records.pack_amount(value)
+    assert packed == (value,) or math.isnan(packed[0])
+    restored = records.Expense.from_dict({'amount': value}).get('amount')
+    assert restored == value or (math.isnan(value) and math.isnan(restored))
+
+
+def test_archived_segments_are_served_from_resident_records(tmp_path):
+    archive_dir = str(tmp_path)
+    old = [dict(expense) for expense in EXPENSES[:3]]
+    archive.archive(horizon_days=30, today=datetime(2025, 7, 1).date(), archive_dir=archive_dir,
+                    stores=_stores(tmp_path, old))
+
+    first = list(archive.iter_archived('expenses', USER, archive_dir=archive_dir))
+    assert sorted(first, key=lambda e: e['id']) == sorted(old, key=lambda e: e['id'])
+
+    # Callers may change what they get back without touching the cache
+    first[0]['description'] = 'changed'
+    assert list(archive.iter_archived('expenses', USER, archive_dir=archive_dir))[0]['description'] != 'changed'
+
+    # A replaced segment is decoded again
+    archive.update_archived('expenses', USER, old[0]['id'], {'description': 'Updated'}, archive_dir=archive_dir)
+    descriptions = {e['description'] for e in archive.iter_archived('expenses', USER, archive_dir=archive_dir)}
+    assert 'Updated' in descriptions
+
+
+def _stores(tmp_path, expenses):
+    stores = {}
+    for kind, data in (('expenses', expenses), ('water', {}), ('friends', {})):
+        path = tmp_path / f'{kind}.json'
+        path.write_text(json.dumps(data))
+        stores[kind] = str(path)
+    return stores
+
+
+@pytest.mark.parametrize('value', ['abc', '', None, 'inf', '-Infinity', 'nan', float('inf')])
+def test_parse_amount_rejects_non_finite_input(value):
+    with pytest.raises(ValueError, match='finite'):
+        records.parse_amount(value)
+
+
+def test_parse_amount_accepts_numbers():
+    assert records.parse_amount('12.50') == 12.5
+    assert records.parse_amount(-3) == -3.0
+
+
+def test_resident_segments_are_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, 'RESIDENT_RECORDS', 5)
+    monkeypatch.setattr(archive, '_resident', archive.OrderedDict())
+    monkeypatch.setattr(archive, '_resident_size', [0])
+    expenses = [{'id': str(uuid.uuid4()), 'user_id': USER, 'description': 'x', 'amount': 1.0,
+                 'date': f'2024-{month:02d}-{day:02d}', 'type': 'expense'}
+                for month in range(1, 7) for day in (1, 2)]
+    archive.archive(horizon_days=0, today=datetime(2025, 1, 1).date(), archive_dir=str(tmp_path),
+                    stores=_stores(tmp_path, expenses))
+
+    assert len(list(archive.iter_archived('expenses', USER, archive_dir=str(tmp_path)))) == len(expenses)
+    assert archive._resident_size[0] <= 5
+    assert archive._resident_size[0] == sum(len(recs) for _, recs in archive._resident.values())
+    # The most recently read months are the ones kept
+    assert list(archive._resident)[-1].endswith('2024-06.json.gz')
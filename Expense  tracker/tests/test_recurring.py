@@ -0,0 +1,173 @@
+import json
+import os
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+import recurring
+
+TODAY = date(2026, 10, 19)
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A scratch expenses store and rules file, and a factory for schedulers over them"""
+    expenses_path = str(tmp_path / 'expenses.json')
+    rules_path = str(tmp_path / 'recurring.json')
+    with open(expenses_path, 'w') as f:
+        json.dump([], f)
+
+    def load_expenses():
+        with open(expenses_path) as f:
+            return json.load(f)
+
+    def save_expenses(expenses):
+        with open(expenses_path + '.tmp', 'w') as f:
+            json.dump(expenses, f)
+        os.replace(expenses_path + '.tmp', expenses_path)
+
+    class Store:
+        path = rules_path
+        load = staticmethod(load_expenses)
+
+        @staticmethod
+        def scheduler():
+            return recurring.Scheduler(load_expenses, save_expenses, expenses_path, rules_path)
+
+        @staticmethod
+        def save_rules(rules):
+            with recurring.locked(rules_path):
+                recurring.save_rules(rules, rules_path)
+
+    return Store
+
+
+def rule(start, frequency='weekly', description='Gym', amount=20.0):
+    return recurring.new_rule({'description': description, 'amount': amount, 'frequency': frequency}, start)
+
+
+@pytest.mark.parametrize('frequency, n, expected', [
+    ('weekly', 3, date(2025, 2, 21)),
+    ('biweekly', 2, date(2025, 2, 28)),
+    ('monthly', 1, date(2025, 2, 28)),
+    ('monthly', 2, date(2025, 3, 31)),
+    ('quarterly', 1, date(2025, 4, 30)),
+    ('yearly', 1, date(2026, 1, 31)),
+])
+def test_occurrence_counts_from_the_start_date(frequency, n, expected):
+    start = date(2025, 1, 31)
+    assert recurring.occurrence(start, frequency, n) == expected
+
+
+def test_catch_up_adds_one_expense_per_missed_period(store):
+    weekly = rule(TODAY - timedelta(weeks=10))
+    store.save_rules({'u': [weekly]})
+
+    scheduler = store.scheduler()
+    assert scheduler.tick(TODAY) == 11
+    dates = sorted(expense['date'] for expense in store.load())
+    assert dates == [(TODAY - timedelta(weeks=10 - i)).isoformat() for i in range(11)]
+
+    saved = recurring.load_rules(store.path)['u'][0]
+    assert saved['occurrences'] == 11
+    assert saved['next_due'] == (TODAY + timedelta(weeks=1)).isoformat()
+
+    # Nothing is due again until next week
+    assert scheduler.tick(TODAY) == 0
+    assert scheduler.tick(TODAY + timedelta(days=6)) == 0
+    assert scheduler.tick(TODAY + timedelta(days=7)) == 1
+
+
+def test_only_due_rules_are_materialised(store):
+    due = rule(TODAY, description='due')
+    later = rule(TODAY + timedelta(days=3), description='later')
+    other = rule(TODAY - timedelta(days=1), 'monthly', description='other user')
+    store.save_rules({'u': [due, later], 'v': [other]})
+
+    assert store.scheduler().tick(TODAY) == 2
+    assert sorted((e['user_id'], e['description']) for e in store.load()) == [('u', 'due'), ('v', 'other user')]
+
+
+def test_rules_changed_by_a_route_are_picked_up_within_the_same_mtime(store):
+    store.save_rules({'u': [rule(TODAY + timedelta(days=1), description='first')]})
+    scheduler = store.scheduler()
+    assert scheduler.tick(TODAY) == 0
+    seen = os.stat(store.path).st_mtime_ns
+
+    # A route adds a rule and the write lands on the same timestamp as the scheduler's view
+    rules = recurring.load_rules(store.path)
+    rules['u'].append(rule(TODAY, description='added'))
+    store.save_rules(rules)
+    os.utime(store.path, ns=(seen, seen))
+
+    assert scheduler.tick(TODAY) == 1
+    assert [r['description'] for r in recurring.load_rules(store.path)['u']] == ['first', 'added']
+
+
+def test_deleted_rules_are_not_brought_back(store):
+    store.save_rules({'u': [rule(TODAY + timedelta(days=1), description='keep'),
+                            rule(TODAY + timedelta(days=1), description='drop')]})
+    scheduler = store.scheduler()
+    scheduler.tick(TODAY)
+    seen = os.stat(store.path).st_mtime_ns
+
+    rules = recurring.load_rules(store.path)
+    rules['u'] = [r for r in rules['u'] if r['description'] == 'keep']
+    store.save_rules(rules)
+    os.utime(store.path, ns=(seen, seen))
+
+    assert scheduler.tick(TODAY + timedelta(days=1)) == 1
+    assert [r['description'] for r in recurring.load_rules(store.path)['u']] == ['keep']
+    assert [e['description'] for e in store.load()] == ['keep']
+
+
+def test_malformed_rules_do_not_hold_up_the_others(store):
+    broken = rule(TODAY, description='broken')
+    broken['start_date'] = 'not a date'
+    store.save_rules({'u': [broken, rule(TODAY, description='fine')]})
+
+    assert store.scheduler().tick(TODAY) == 1
+    assert [e['description'] for e in store.load()] == ['fine']
+
+
+def test_a_failed_tick_is_retried_from_the_file(store, monkeypatch):
+    store.save_rules({'u': [rule(TODAY - timedelta(weeks=2))]})
+    scheduler = store.scheduler()
+
+    def fail(expenses):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(scheduler, 'save_expenses', fail)
+    with pytest.raises(OSError):
+        scheduler.tick(TODAY)
+    assert scheduler.version is None
+    assert store.load() == []
+
+    monkeypatch.undo()
+    assert scheduler.tick(TODAY) == 3
+    assert len(store.load()) == 3
+
+
+def test_schedulers_in_several_workers_add_each_occurrence_once(store):
+    store.save_rules({user: [rule(TODAY - timedelta(weeks=5)), rule(TODAY - timedelta(days=40), 'monthly')]
+                      for user in ('u', 'v', 'w')})
+    schedulers = [store.scheduler() for _ in range(4)]
+    barrier = threading.Barrier(len(schedulers))
+    added = []
+
+    def worker(scheduler):
+        barrier.wait()
+        for day in range(3):
+            added.append(scheduler.tick(TODAY + timedelta(days=day)))
+
+    threads = [threading.Thread(target=worker, args=(scheduler,)) for scheduler in schedulers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    expenses = store.load()
+    assert sum(added) == len(expenses) == 3 * (6 + 2)
+    keys = [(e['user_id'], e['recurring_rule_id'], e['date']) for e in expenses]
+    assert len(set(keys)) == len(keys)
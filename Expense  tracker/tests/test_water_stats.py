@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+import water_stats
+
+START = 738000
+
+
+def brute_force(log, today):
+    """The stats computed straight from {day: (amount, goal)} of recorded days"""
+    days = {day: amount for day, (amount, _) in log.items()}
+    met = {day for day, (amount, goal) in log.items() if goal > 0 and amount >= goal}
+
+    averages = {}
+    first = min(days) if days else None
+    for window in water_stats.WINDOWS:
+        total = sum(amount for day, amount in days.items() if today - window < day <= today)
+        span = 0 if first is None else min(window, today - first + 1)
+        averages[f'{window}d'] = round(total / span) if span > 0 else 0
+
+    day = today if today in met else today - 1
+    current = 0
+    while day in met:
+        current += 1
+        day -= 1
+
+    best = run = 0
+    for day in range(min(days) if days else today, today + 1):
+        run = run + 1 if day in met else 0
+        best = max(best, run)
+
+    return {
+        'averages': averages,
+        'days_tracked': len(days),
+        'days_goal_met': len(met),
+        'goal_hit_rate': round(len(met) / len(days), 3) if days else 0.0,
+        'current_streak': current,
+        'best_streak': best,
+    }
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_summary_matches_brute_force(seed):
+    rng = random.Random(seed)
+    rollup = water_stats.empty(START)
+    log = {}
+    day = START
+    for _ in range(150):
+        # Mostly consecutive days, with the odd gap, some long enough to empty every window
+        day += rng.choice((0, 1, 1, 1, 2, 5, 40, 400))
+        goal = rng.choice((0, 1500, 2000))
+        amount = rng.choice((0, 500, 1500, 2000, 2500))
+        water_stats.record(rollup, day, amount, goal)
+        log[day] = (amount, goal)
+
+        today = day + rng.choice((0, 0, 1, 3, 400))
+        assert water_stats.summary(rollup, today) == brute_force(log, today)
+        assert len(rollup['amounts']) <= water_stats.RING_SIZE
+
+
+def test_rebuild_matches_recording_as_you_go():
+    history = [{'date': f'2024-01-{d:02d}', 'amount': 2000 if d % 3 else 500} for d in range(1, 29)]
+    today = water_stats.date(2024, 2, 1).toordinal()
+
+    rollup = water_stats.empty(water_stats.date(2024, 1, 1).toordinal())
+    for entry in history:
+        water_stats.record(rollup, water_stats.date.fromisoformat(entry['date']).toordinal(), entry['amount'], 2000)
+
+    assert water_stats.summary(water_stats.rebuild(history, 2000, today), today) == water_stats.summary(rollup, today)
+
+
+def test_summary_does_not_modify_the_rollup():
+    rollup = water_stats.record(water_stats.empty(START), START, 2000, 2000)
+    before = repr(rollup)
+    water_stats.summary(rollup, START + 500)
+    assert repr(rollup) == before
+
+
+def test_goal_change_on_an_untracked_day_does_not_track_it():
+    rollup = water_stats.record(water_stats.empty(START), START, 2000, 2000)
+    water_stats.set_goal(rollup, START + 1, 0, 1500)
+
+    stats = water_stats.summary(rollup, START + 1)
+    assert stats['days_tracked'] == 1
+    assert stats['goal_hit_rate'] == 1.0
+
+
+def test_goal_change_re_evaluates_a_tracked_day():
+    rollup = water_stats.record(water_stats.empty(START), START, 1500, 2000)
+    assert water_stats.summary(rollup, START)['days_goal_met'] == 0
+
+    water_stats.set_goal(rollup, START, 1500, 1500)
+    assert water_stats.summary(rollup, START)['days_goal_met'] == 1
+
+
+def test_rollups_are_stored_per_user(tmp_path):
+    rollup = water_stats.record(water_stats.empty(START), START, 750, 2000)
+    water_stats.save('user-1', rollup, str(tmp_path))
+
+    assert water_stats.load('user-1', str(tmp_path)) == rollup
+    assert water_stats.load('user-2', str(tmp_path)) is None
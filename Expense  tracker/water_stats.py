@@ -0,0 +1,153 @@
+"""Incremental water intake rollups behind /water/stats.
+
+Each user's rollup is kept in its own small file, water_stats/<user_id>.json,
+next to (not inside) water.json, and update_water keeps it current, so the
+stats never walk the history list:
+
+    day          ordinal of the latest day recorded
+    amounts      {day ordinal: amount} for the last 365 days, non-zero days only
+    sums         running totals of the 7/30/365-day windows ending at `day`
+    first_day    first day with an entry (so new users aren't averaged over a full year)
+    tracked      finalised days with an entry / of those, days the goal was met
+    met
+    streak       goal-met streak ending the day before `day`
+    best         best goal-met streak before `day`
+    today_tracked, today_met
+
+Moving to a new day only touches the days that fall out of each window, so
+every operation is bounded by the window size, not the history length.
+"""
+import json
+import os
+from datetime import date
+
+WINDOWS = (7, 30, 365)
+RING_SIZE = max(WINDOWS)
+ROLLUP_DIR = 'water_stats'
+
+
+def _path(user_id, rollup_dir):
+    return os.path.join(rollup_dir, f'{user_id}.json')
+
+
+def load(user_id, rollup_dir=ROLLUP_DIR):
+    """The user's stored rollup, or None if it hasn't been built yet"""
+    try:
+        with open(_path(user_id, rollup_dir), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save(user_id, rollup, rollup_dir=ROLLUP_DIR):
+    os.makedirs(rollup_dir, exist_ok=True)
+    path = _path(user_id, rollup_dir)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(rollup, f)
+    os.replace(path + '.tmp', path)
+
+
+def empty(day):
+    return {
+        'day': day,
+        'amounts': {},
+        'sums': {str(window): 0 for window in WINDOWS},
+        'first_day': None,
+        'tracked': 0,
+        'met': 0,
+        'streak': 0,
+        'best': 0,
+        'today_tracked': False,
+        'today_met': False,
+    }
+
+
+def advance(rollup, day):
+    """Move the rollup forward to `day`, finalising the days in between"""
+    old = rollup['day']
+    if day <= old:
+        return rollup
+    gap = day - old
+
+    # Close out the old day
+    ended = rollup['streak'] + 1 if rollup['today_met'] else 0
+    rollup['best'] = max(rollup['best'], ended)
+    rollup['streak'] = ended if gap == 1 else 0
+    rollup['tracked'] += rollup['today_tracked']
+    rollup['met'] += rollup['today_met']
+    rollup['today_tracked'] = False
+    rollup['today_met'] = False
+
+    # Drop the days that slide out of each window, then forget the ones no window covers
+    amounts = rollup['amounts']
+    for window in WINDOWS:
+        leaving = range(old - window + 1, min(old, day - window) + 1)
+        rollup['sums'][str(window)] -= sum(amounts.get(str(d), 0) for d in leaving)
+    for key in [key for key in amounts if int(key) <= day - RING_SIZE]:
+        del amounts[key]
+
+    rollup['day'] = day
+    return rollup
+
+
+def record(rollup, day, amount, goal):
+    """Set the intake for `day` (today, or the latest day) and update every counter"""
+    advance(rollup, day)
+    if day != rollup['day']:
+        return rollup
+
+    key = str(day)
+    delta = amount - rollup['amounts'].get(key, 0)
+    if amount:
+        rollup['amounts'][key] = amount
+    else:
+        rollup['amounts'].pop(key, None)
+    for window in WINDOWS:
+        rollup['sums'][str(window)] += delta
+
+    if rollup['first_day'] is None:
+        rollup['first_day'] = day
+    rollup['today_tracked'] = True
+    rollup['today_met'] = goal > 0 and amount >= goal
+    return rollup
+
+
+def set_goal(rollup, day, amount, goal):
+    """Re-check today's goal after it changed; a day without an entry stays untracked"""
+    advance(rollup, day)
+    if day == rollup['day'] and rollup['today_tracked']:
+        rollup['today_met'] = goal > 0 and amount >= goal
+    return rollup
+
+
+def rebuild(history, goal, today):
+    """Build a rollup from existing history entries (one-off, for data saved before rollups)"""
+    entries = sorted((date.fromisoformat(entry['date'][:10]).toordinal(), entry.get('amount', 0))
+                     for entry in history if entry.get('date'))
+    rollup = empty(entries[0][0] if entries else today)
+    for day, amount in entries:
+        record(rollup, day, int(amount), goal)
+    return advance(rollup, today)
+
+
+def summary(rollup, today):
+    """Stats as of `today`, without modifying the stored rollup"""
+    rollup = advance(dict(rollup, amounts=dict(rollup['amounts']), sums=dict(rollup['sums'])), today)
+
+    averages = {}
+    for window in WINDOWS:
+        span = 0 if rollup['first_day'] is None else min(window, today - rollup['first_day'] + 1)
+        averages[f'{window}d'] = round(rollup['sums'][str(window)] / span) if span > 0 else 0
+
+    tracked = rollup['tracked'] + rollup['today_tracked']
+    met = rollup['met'] + rollup['today_met']
+    current_streak = rollup['streak'] + 1 if rollup['today_met'] else rollup['streak']
+
+    return {
+        'averages': averages,
+        'days_tracked': tracked,
+        'days_goal_met': met,
+        'goal_hit_rate': round(met / tracked, 3) if tracked else 0.0,
+        'current_streak': current_streak,
+        'best_streak': max(rollup['best'], current_streak),
+    }